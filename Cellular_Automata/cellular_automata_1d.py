@@ -1,18 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import wx
-import time
 from threading import *
 import numpy as np
 from enum import Enum, unique
 import random
 import itertools
+import os
+import multiprocessing
+import argparse
+import struct
+import zlib
+import tempfile
+import hashlib
+import functools
+import queue
+import collections
+import concurrent.futures
+import zipfile
 
 @unique
 class Thread_Result(Enum):
     aborted = 0
     finished = 1
 
+@unique
+class Engine(Enum):
+    python = 0      # per-cell reference implementation
+    numpy = 1       # uint8 row, 8-entry lookup table
+    bitpacked = 2   # 64 cells per uint64 word, rule compiled to a bitwise expression
+    block = 3       # uint8 row, jumps Config.block_generations per table lookup
+    general = 4     # uint8 row, any Config.radius / Config.states, full or totalistic
+
+@unique
+class HistoryMode(Enum):
+    memory = 0      # keep every row in a list
+    ring = 1        # keep the last Config.history_rows rows
+    disk = 2        # keep every row as packed bits in a memory-mapped file
+    stream = 3      # only pass rows to the writer, keep the last row
+
 def convert_dec_to_binstr(num, length):
     binstr = bin(int(str(num), 10))
     binstr = binstr[2:]
@@ -35,25 +61,298 @@ class Config():
     #Color_zero = wx.Colour(255, 255, 255)   # white
     grid_size = 1
     interval = 2
+    engine = Engine.numpy
+    rule_nums = range(0, 256)
+    sweep = True                # evolve all rule_nums together instead of one by one (numpy engine, record_every 1)
+    row_block_bytes = 64 << 20      # rows sweeps and pool processes hand on to the histories at a time
+    processes = None            # compute processes of sweeps and rule pipelines, None = one per core
+    image_format = 'png'        # 'png' or 'pbm', both lossless
+    image_dir = '.'
+    history_mode = HistoryMode.ring
+    history_rows = 1024         # ring size, about one window; longer runs are encoded while computed
+    history_dir = None          # directory of the disk history files, None = system temp
+    detect_cycle = True         # stop a rule once its state repeats
+    continue_cycle = False      # after a repeat, fill the remaining rows by replaying the cycle
+    dedup_symmetry = True       # derive mirrored / complemented rules in a sweep instead of evolving them
+    cache_dir = 'ca_cache'      # on-disk cache of sweep results, None = no cache
+    record_every = 1            # single-rule runs keep only every n-th generation
+    block_generations = 4       # generations per lookup of Engine.block, blocks are 8 + 2 * n cells
+    pipeline_depth = 4          # finished histories waiting for an encoder, and rules computed ahead
+    encoder_threads = 2
+    initial_pattern = 'ones'    # 'ones' (all ones but the last cell), 'alternating' or 'random'
+    ensemble_samples = 1000     # random initial conditions per rule in ensemble mode
+    entropy_block = 3           # block length of the block entropy in ensemble mode
+    radius = 1                  # neighbourhood radius of Engine.general
+    states = 2                  # states per cell of Engine.general
+    totalistic = False          # Engine.general rule depends only on the neighbourhood sum
+    refresh_interval = 100      # ms between checks of the window for new rows
+    zoom_max = 32               # pixels per cell
+
+# Every history takes rows through append() / extend() and passes them on to an optional
+# writer (e.g. ImageWriter), so rows can be saved without being kept.
+# rows(count) yields the last count kept rows, oldest first.
+class History():
+    def __init__(self, writer = None):
+        self.writer = writer
+        self.count = 0      # rows appended so far, kept or not
+        self.cycle = None   # (transient, period) once the state repeated
+
+    def append(self, row):
+        self._store_rows(np.asarray(row, dtype=np.uint8)[None, :])
+        self.count += 1
+        if self.writer is not None:
+            self.writer.write_row(row)
+
+    # rows is a (rows x cells) array
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        self._store_rows(rows)
+        self.count += len(rows)
+        if self.writer is not None:
+            self.writer.write_rows(rows)
+
+    def last(self):
+        return next(self.rows(1))
+
+    def close(self):
+        pass
+
+class MemoryHistory(History):
+    def __init__(self, writer = None):
+        History.__init__(self, writer)
+        self._rows = list()
+
+    def _store_rows(self, rows):
+        self._rows.extend(rows)
+
+    def rows(self, count = None):
+        start = 0 if count is None else max(0, len(self._rows) - count)
+        return iter(self._rows[start:])
+
+class RingHistory(History):
+    def __init__(self, capacity, writer = None):
+        History.__init__(self, writer)
+        self._buffer = np.zeros((capacity, Config.scale), dtype=np.uint8)
+
+    def _store_rows(self, rows):
+        capacity = len(self._buffer)
+        end = self.count + len(rows)
+        rows = rows[-capacity:]
+        index = np.arange(end - len(rows), end) % capacity
+        self._buffer[index] = rows
+
+    def rows(self, count = None):
+        kept = min(self.count, len(self._buffer))
+        count = kept if count is None else min(count, kept)
+        for i in range(self.count - count, self.count):
+            yield self._buffer[i % len(self._buffer)]
+
+class DiskHistory(History):
+    def __init__(self, capacity, writer = None):
+        History.__init__(self, writer)
+        # rows of 0/1 are packed to bits, cells with more states take a byte
+        self._packed = Config.states == 2
+        self._row_bytes = (Config.scale + 7) // 8 if self._packed else Config.scale
+        self._file = tempfile.TemporaryFile(dir=Config.history_dir)     # removed on close
+        self._map = None
+        # the GUI thread reads rows while the compute thread appends and remaps the file
+        self._lock = Lock()
+        self._resize(max(capacity, 1))
+
+    def _resize(self, capacity):
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+        self._file.truncate(capacity * self._row_bytes)
+        self._map = np.memmap(self._file, dtype=np.uint8, mode='r+', shape=(capacity, self._row_bytes))
+
+    def _store_rows(self, rows):
+        with self._lock:
+            if self.count + len(rows) > len(self._map):
+                self._resize(max(2 * len(self._map), self.count + len(rows)))
+            self._map[self.count : self.count + len(rows)] = np.packbits(rows, axis=1) if self._packed else rows
+
+    # rows are copied out of the map a block at a time under the lock, never read from a
+    # map that is being replaced
+    def rows(self, count = None):
+        end = self.count
+        start = end - (end if count is None else min(count, end))
+        while start < end:
+            with self._lock:
+                if self._map is None:
+                    return
+                block = np.array(self._map[start : min(start + 1024, end)])
+            start += len(block)
+            for row in block:
+                yield np.unpackbits(row)[:Config.scale] if self._packed else row
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+                del self._map
+                self._map = None
+                self._file.close()
+
+class StreamHistory(History):
+    def __init__(self, writer = None):
+        History.__init__(self, writer)
+        self._last = None
+
+    def _store_rows(self, rows):
+        self._last = rows[-1].copy()
+
+    def rows(self, count = None):
+        if self._last is not None and count != 0:
+            yield self._last
+
+def create_history(writer = None, mode = None):
+    mode = Config.history_mode if mode is None else mode
+    if mode == HistoryMode.memory:
+        return MemoryHistory(writer)
+    elif mode == HistoryMode.ring:
+        # a sweep holds one ring per rule, bounded whatever evolution_max is
+        return RingHistory(min(Config.history_rows, Config.evolution_max + 1), writer)
+    elif mode == HistoryMode.disk:
+        return DiskHistory(Config.evolution_max + 1, writer)
+    elif mode == HistoryMode.stream:
+        return StreamHistory(writer)
+    else:
+        raise Exception('Invalid history mode: %s' % mode)
+
+def initial_data_list():
+    data_list = list()
+    for i in range(Config.scale):
+        if Config.initial_pattern == 'alternating':
+            data_list.append(i % 2)
+        elif Config.initial_pattern == 'random':
+            data_list.append(random.randint(0, Config.states - 1))
+        elif Config.initial_pattern == 'ones':
+            data_list.append(1)
+        else:
+            raise Exception('Invalid initial pattern: %s' % Config.initial_pattern)
+    if Config.initial_pattern == 'ones':
+        data_list[-1] = 0
+    return data_list
 
 class DataStore():
     def __init__(self):
+        self.evolution_history = None
         self.reset()
 
-    def reset(self):
-        self.finished = False
-        self.evolution_history = list()
-        data_list = list()
-        for i in range(Config.scale):
-            #data_list.append(i % 2)
-            data_list.append(1)
-            #data_list.append(random.randint(0, 1))
-        data_list[-1] = 0
-        self.evolution_history.append(data_list)
+    def reset(self, writer = None):
+        if self.evolution_history is not None:
+            self.evolution_history.close()
+        self.evolution_history = create_history(writer)
+        self.evolution_history.append(initial_data_list())
 
 # global variable
 dataStore = DataStore()
 
+# Writes a spacetime diagram straight from rows of cells, black for 1 and white for 0;
+# with more than 2 states cells are gray levels from white (0) to black (states - 1).
+# Rows are encoded as they arrive, so memory does not depend on the number of rows.
+class ImageWriter():
+    def __init__(self, name, width, height, cell_size = None, image_format = None, states = None):
+        self._cell_size = Config.grid_size if cell_size is None else cell_size
+        self._format = Config.image_format if image_format is None else image_format
+        self._states = Config.states if states is None else states
+        self._width = width * self._cell_size
+        self._height = height * self._cell_size
+        self._rows_written = 0
+        if self._format == 'png':
+            self._file = open(name + '.png', 'wb')
+            self._file.write(b'\x89PNG\r\n\x1a\n')
+            self._write_png_header()
+            self._compressor = zlib.compressobj()
+        elif self._format == 'pbm':
+            # pbm is 1 bit, more states need pgm
+            self._file = open(name + ('.pbm' if self._states == 2 else '.pgm'), 'wb')
+            self._write_pbm_header()
+        else:
+            raise Exception('Invalid image format: %s' % self._format)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # 1-bit or 8-bit grayscale, no interlace
+    def _write_png_header(self):
+        bit_depth = 1 if self._states == 2 else 8
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', self._width, self._height, bit_depth, 0, 0, 0, 0))
+
+    # the height is padded to a fixed width so it can be rewritten in place
+    def _write_pbm_header(self):
+        if self._states == 2:
+            self._file.write(b'P4\n%d %10d\n' % (self._width, self._height))
+        else:
+            self._file.write(b'P5\n%d %10d\n255\n' % (self._width, self._height))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def write_row(self, row):
+        self.write_rows(np.asarray(row, dtype=np.uint8)[None, :])
+
+    # rows is a (rows x cells) array
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        if self._cell_size > 1:
+            rows = np.repeat(np.repeat(rows, self._cell_size, axis=0), self._cell_size, axis=1)
+        if self._states == 2:
+            # png grayscale 0 is black, pbm 1 is black
+            lines = np.packbits(rows ^ 1 if self._format == 'png' else rows, axis=1)
+        else:
+            lines = (255 - rows.astype(np.uint16) * 255 // (self._states - 1)).astype(np.uint8)
+        if self._format == 'png':
+            lines = np.hstack((np.zeros((len(lines), 1), dtype=np.uint8), lines))   # filter type 0
+            data = self._compressor.compress(lines.tobytes())
+            if data:
+                self._write_chunk(b'IDAT', data)
+        else:
+            self._file.write(lines.tobytes())
+        self._rows_written += len(rows)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._format == 'png':
+            self._write_chunk(b'IDAT', self._compressor.flush())
+            self._write_chunk(b'IEND', b'')
+        # a run that stopped early (aborted) keeps the rows it has
+        if self._rows_written != self._height:
+            self._height = self._rows_written
+            if self._format == 'png':
+                self._file.seek(8)
+                self._write_png_header()
+            else:
+                self._file.seek(0)
+                self._write_pbm_header()
+        self._file.close()
+        self._file = None
+
+def save_history_image(history, name, cell_size = None, image_format = None):
+    history = np.asarray(history, dtype=np.uint8)
+    with ImageWriter(name, history.shape[1], history.shape[0], cell_size, image_format) as writer:
+        writer.write_rows(history)
+
+# sweeps only cover the elementary rules
+# sweeps step elementary rules with their own NumPy batch and keep every generation,
+# other engines and record_every run rule by rule
+def sweeping():
+    return Config.sweep and Config.engine == Engine.numpy and Config.record_every == 1
+
+def rule_image_name(rule_num):
+    if not sweeping() and Config.engine == Engine.general:
+        kind = 't' if Config.totalistic else 'f'
+        return os.path.join(Config.image_dir, "r%d-k%d-%s-%d" % (Config.radius, Config.states, kind, rule_num))
+    return os.path.join(Config.image_dir, str(rule_num) + "-" + convert_dec_to_binstr(rule_num, 8))
+
 # x, y is index of dim 1 and dim 2, not position!
 def get_evolution_value(index, data_list) -> int:
     pre_index = index - 1 if (index > 0) else Config.scale - 1
@@ -82,6 +381,828 @@ def evolution_rule(condition: str) -> int:
     else:
         raise Exception('Invalid condition: ' + condition)
 
+# rule table indexed by the 3-bit neighbourhood (left << 2 | centre << 1 | right),
+# so table[i] is bit i of rule_num, the same as Config.rule_str[7 - i]
+def build_rule_table(rule_num) -> np.ndarray:
+    return ((rule_num >> np.arange(8)) & 1).astype(np.uint8)
+
+# Engines share one interface: pack() turns a list of 0/1 into the engine state,
+# step() computes the next generation and unpack() gives back a row for drawing.
+# advance() computes several generations when the rows in between are not needed.
+class StepEngine():
+    def advance(self, state, generations):
+        for i in range(generations):
+            state = self.step(state)
+        return state
+
+class PythonEngine(StepEngine):
+    def __init__(self, rule_num):
+        self._rule_str = convert_dec_to_binstr(rule_num, 8)
+
+    def pack(self, data_list):
+        return list(data_list)
+
+    def unpack(self, state):
+        return state
+
+    def step(self, state):
+        Config.rule_str = self._rule_str
+        return [get_evolution_value(i, state) for i in range(Config.scale)]
+
+class NumpyEngine(StepEngine):
+    def __init__(self, rule_num):
+        self._rule_table = build_rule_table(rule_num)
+
+    def pack(self, data_list):
+        return np.asarray(data_list, dtype=np.uint8)
+
+    def unpack(self, state):
+        return state
+
+    # state can also be a (rows x cells) batch, each row evolves on its own
+    def step(self, state):
+        # periodic boundary, same as get_evolution_value
+        index = np.roll(state, 1, axis=-1) << 2
+        index |= state << 1
+        index |= np.roll(state, -1, axis=-1)
+        return self._rule_table[index]
+
+# boolean functions of (centre, right) indexed by their 4-bit truth table,
+# bit (centre << 1 | right) of the index is the output; z is an all-zero word array
+_two_input_exprs = ['z', '~(c | r)', '~c & r', '~c', 'c & ~r', '~r', 'c ^ r', '~(c & r)',
+                    'c & r', '~(c ^ r)', 'r', '~c | r', 'c', 'c | ~r', 'c | r', '~z']
+
+# split the truth table on the left cell and pick the simplest way to join both halves
+def compile_rule_expression(rule_num) -> str:
+    table_0 = rule_num & 0xF        # left = 0
+    table_1 = rule_num >> 4         # left = 1
+    expr_0 = _two_input_exprs[table_0]
+    expr_1 = _two_input_exprs[table_1]
+    if table_0 == table_1:
+        return expr_0
+    if table_0 == 0:
+        return 'l & (%s)' % expr_1
+    if table_1 == 0:
+        return '~l & (%s)' % expr_0
+    if table_1 == 0xF:
+        return 'l | (%s)' % expr_0
+    if table_0 == 0xF:
+        return '~l | (%s)' % expr_1
+    if table_0 ^ table_1 == 0xF:
+        return 'l ^ (%s)' % expr_0
+    return '(l & (%s)) | (~l & (%s))' % (expr_1, expr_0)
+
+class BitPackedEngine(StepEngine):
+    _one = np.uint64(1)
+    _top = np.uint64(63)
+
+    def __init__(self, rule_num):
+        self._expression = compile_rule_expression(rule_num)
+        self._rule = eval('lambda l, c, r, z: ' + self._expression)
+        self._scale = Config.scale
+        self._last_bit = np.uint64((self._scale - 1) % 64)
+        self._words = (self._scale + 63) // 64
+        tail = self._scale % 64
+        self._last_mask = np.uint64((1 << tail) - 1) if tail else ~np.uint64(0)
+
+    # cell i is bit (i % 64) of word (i // 64), padding bits are kept zero
+    def pack(self, data_list):
+        data = np.packbits(np.asarray(data_list, dtype=np.uint8), bitorder='little')
+        words = np.zeros(self._words * 8, dtype=np.uint8)
+        words[:len(data)] = data
+        return words.view('<u8').astype(np.uint64)
+
+    def unpack(self, state):
+        data = state.astype('<u8').view(np.uint8)
+        return np.unpackbits(data, bitorder='little')[:self._scale]
+
+    def step(self, state):
+        # bit i of left is cell i - 1, carried across words and wrapped from the last cell
+        left = state << self._one
+        left[1:] |= state[:-1] >> self._top
+        left[0] |= (state[-1] >> self._last_bit) & self._one
+        # bit i of right is cell i + 1, the last cell wraps to cell 0
+        right = state >> self._one
+        right[:-1] |= state[1:] << self._top
+        right[-1] |= (state[0] & self._one) << self._last_bit
+        new_state = self._rule(left, state, right, np.zeros_like(state))
+        new_state[-1] &= self._last_mask
+        return new_state
+
+# table from a block of 8 + 2 * generations cells (first cell in the highest bit) to its
+# centre 8 cells after that many generations, packed as one byte (first cell in the highest bit)
+@functools.lru_cache(maxsize=32)
+def build_block_table(rule_num, generations) -> np.ndarray:
+    width = 8 + 2 * generations
+    blocks = ((np.arange(1 << width)[:, None] >> np.arange(width - 1, -1, -1)) & 1).astype(np.uint8)
+    rule_table = build_rule_table(rule_num)
+    for i in range(generations):
+        index = blocks[:, :-2] << 2
+        index |= blocks[:, 1:-1] << 1
+        index |= blocks[:, 2:]
+        blocks = rule_table[index]
+    return np.packbits(blocks, axis=1)[:, 0]
+
+class BlockEngine(NumpyEngine):
+    def __init__(self, rule_num):
+        NumpyEngine.__init__(self, rule_num)
+        self._generations = Config.block_generations
+        if not 1 <= self._generations <= 8:
+            raise Exception('Invalid block_generations: %d' % self._generations)
+        self._table = build_block_table(rule_num, self._generations)
+        self._chunks = (Config.scale + 7) // 8
+        # cells of the row unrolled periodically, block j starts at cell 8 * j
+        self._cells = np.arange(-self._generations, 8 * self._chunks + self._generations) % Config.scale
+        self._shift = np.uint32(24 - (8 + 2 * self._generations))
+        self._mask = np.uint32((1 << (8 + 2 * self._generations)) - 1)
+
+    # Config.block_generations generations in one table lookup per 8 cells
+    def jump(self, state):
+        data = np.zeros(self._chunks + 4, dtype=np.uint32)
+        packed = np.packbits(state[self._cells])
+        data[:len(packed)] = packed
+        index = data[:self._chunks] << np.uint32(16)
+        index |= data[1:self._chunks + 1] << np.uint32(8)
+        index |= data[2:self._chunks + 2]
+        index = (index >> self._shift) & self._mask
+        return np.unpackbits(self._table[index])[:Config.scale]
+
+    def advance(self, state, generations):
+        while generations >= self._generations:
+            state = self.jump(state)
+            generations -= self._generations
+        return NumpyEngine.advance(self, state, generations)
+
+# Radius-r, k-state rules as a dense lookup table. rule_num is the Wolfram code: digit i
+# (base k) of rule_num is the new state for neighbourhood index i. The index of a full rule
+# reads the 2r + 1 cells as a base-k number, leftmost cell first, so radius 1 and 2 states
+# give the elementary rules; the index of a totalistic rule is the sum of the cells.
+class GeneralEngine(NumpyEngine):
+    def __init__(self, rule_num, radius = None, states = None, totalistic = None):
+        self._radius = Config.radius if radius is None else radius
+        self._states = Config.states if states is None else states
+        self._totalistic = Config.totalistic if totalistic is None else totalistic
+        self._rule_table = build_general_rule_table(rule_num, self._radius, self._states, self._totalistic)
+        self._index_type = np.uint16 if len(self._rule_table) <= 1 << 16 else np.intp
+
+    def step(self, state):
+        index = np.zeros(state.shape, dtype=self._index_type)
+        for offset in range(self._radius, -self._radius - 1, -1):
+            if not self._totalistic:
+                index *= self._states
+            index += np.roll(state, offset, axis=-1)
+        return self._rule_table[index]
+
+def general_rule_size(radius, states, totalistic):
+    width = 2 * radius + 1
+    return width * (states - 1) + 1 if totalistic else states ** width
+
+def build_general_rule_table(rule_num, radius, states, totalistic) -> np.ndarray:
+    size = general_rule_size(radius, states, totalistic)
+    table = np.zeros(size, dtype=np.uint8)
+    for i in range(size):
+        rule_num, table[i] = divmod(rule_num, states)
+    if rule_num:
+        raise Exception('Rule number out of range for radius %d, %d states' % (radius, states))
+    return table
+
+def random_general_rule(radius, states, totalistic, rng = random):
+    return rng.randrange(states ** general_rule_size(radius, states, totalistic))
+
+def create_engine(rule_num, engine = None):
+    engine = Config.engine if engine is None else engine
+    if engine == Engine.python:
+        return PythonEngine(rule_num)
+    elif engine == Engine.numpy:
+        return NumpyEngine(rule_num)
+    elif engine == Engine.bitpacked:
+        return BitPackedEngine(rule_num)
+    elif engine == Engine.block:
+        return BlockEngine(rule_num)
+    elif engine == Engine.general:
+        return GeneralEngine(rule_num)
+    else:
+        raise Exception('Invalid engine: %s' % engine)
+
+# (256 x 8) table, row r is build_rule_table(r)
+def build_all_rule_tables() -> np.ndarray:
+    return ((np.arange(256)[:, None] >> np.arange(8)) & 1).astype(np.uint8)
+
+# Worker of sweep_rules: evolves rules, given by their rule tables, from their (rules x cells)
+# state for generations generations. Returns the (rules x generations x cells) rows and, for
+# the rules with digest[j] set, the state_digest of every row.
+def evolve_rules(rule_tables, state, generations, digest):
+    rows = np.empty((len(state), generations, state.shape[1]), dtype=np.uint8)
+    for i in range(generations):
+        index = np.roll(state, 1, axis=1) << 2
+        index |= state << 1
+        index |= np.roll(state, -1, axis=1)
+        state = np.take_along_axis(rule_tables, index, axis=1)
+        rows[:, i] = state
+    digests = [[state_digest(row) for row in rows[j]] if digest[j] else None for j in range(len(rows))]
+    return rows, digests
+
+# Evolve rule_nums together as a (rules x cells) array, a block of Config.row_block_bytes rows
+# at a time split over a process pool, so memory does not depend on evolution_max.
+# Yields (j, rows, None) for every block of rows of rule_nums[j], the initial row first, and
+# (j, None, cycle) once the rule is finished; cycle is (transient, period), or None if the state
+# never repeated. With Config.detect_cycle a rule leaves the batch at its first repeated row;
+# with Config.continue_cycle its remaining rows are then replayed from the cycle.
+# Once the abort event is set the sweep stops before its next block.
+def sweep_rules(rule_nums, data_list, evolution_max, processes = None, abort = None):
+    rule_nums = np.asarray(rule_nums)
+    processes = processes or Config.processes or os.cpu_count() or 1
+    processes = min(processes, len(rule_nums))
+    rule_tables = build_all_rule_tables()[rule_nums]
+    state = np.tile(np.asarray(data_list, dtype=np.uint8), (len(rule_nums), 1))
+    active = np.arange(len(rule_nums))
+    cycles = [None] * len(rule_nums)
+    # digest -> generation of every state so far, None once the rule repeated
+    seen = [{state_digest(state[0]): 0} if Config.detect_cycle else None for j in active]
+    for j in active:
+        yield j, state[j : j + 1], None
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        generation = 1
+        while generation <= evolution_max and len(active):
+            if abort is not None and abort.is_set():
+                return
+            generations = max(1, Config.row_block_bytes // (len(active) * state.shape[1]))
+            generations = min(generations, evolution_max + 1 - generation)
+            digest = np.array([seen[j] is not None for j in active])
+            if pool is None:
+                rows, digests = evolve_rules(rule_tables, state, generations, digest)
+            else:
+                blocks = np.array_split(np.arange(len(active)), min(processes, len(active)))
+                results = pool.starmap(evolve_rules, [(rule_tables[b], state[b], generations, digest[b]) for b in blocks])
+                rows = np.concatenate([r[0] for r in results])
+                digests = [d for r in results for d in r[1]]
+            state = rows[:, -1].copy()
+            keep = np.ones(len(active), dtype=bool)
+            for k in range(len(active)):
+                j = active[k]
+                count = generations
+                if seen[j] is not None:
+                    for g in range(generations):
+                        first = seen[j].setdefault(digests[k][g], generation + g)
+                        if first == generation + g:
+                            continue
+                        cycles[j] = (first, generation + g - first)
+                        count = g + 1
+                        keep[k] = False
+                        break
+                yield j, rows[k, :count], None
+                if not keep[k]:
+                    if Config.continue_cycle:
+                        for block in replay_sweep_cycle(j, rule_tables[k], rows[k, count - 1], cycles[j], generation + count, evolution_max):
+                            if abort is not None and abort.is_set():
+                                return
+                            yield block
+                    yield j, None, cycles[j]
+            if not keep.all():
+                active = active[keep]
+                state = state[keep]
+                rule_tables = rule_tables[keep]
+            generation += generations
+        for j in active:
+            yield j, None, cycles[j]
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+# (j, rows, None) in blocks for generations start ... evolution_max of a rule in a cycle;
+# repeated is its state at generation start - 1, the same as at the transient
+def replay_sweep_cycle(j, rule_table, repeated, cycle, start, evolution_max):
+    transient, period = cycle
+    # states[i] is the state of generation transient + i
+    states = np.empty((period, len(repeated)), dtype=np.uint8)
+    states[0] = repeated
+    if period > 1:
+        states[1:] = evolve_rules(rule_table[None], repeated[None], period - 1, [False])[0][0]
+    block = max(1, Config.row_block_bytes // len(repeated))
+    for begin in range(start, evolution_max + 1, block):
+        end = min(begin + block, evolution_max + 1)
+        yield j, states[(np.arange(begin, end) - transient) % period], None
+
+def state_digest(state):
+    data = bytes(state) if isinstance(state, list) else state.tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# rule of the left-right reflection: bit (l, c, r) of the new rule is bit (r, c, l)
+def mirror_rule(rule_num):
+    return sum(((rule_num >> i) & 1) << (((i & 1) << 2) | (i & 2) | (i >> 2)) for i in range(8))
+
+# rule of the 0/1 complement: bit (l, c, r) of the new rule is 1 - bit (~l, ~c, ~r)
+def complement_rule(rule_num):
+    return sum((1 - ((rule_num >> (7 - i)) & 1)) << i for i in range(8))
+
+def mirror_complement_rule(rule_num):
+    return complement_rule(mirror_rule(rule_num))
+
+def mirror_rows(rows):
+    return rows[..., ::-1]
+
+def complement_rows(rows):
+    return rows ^ 1
+
+def mirror_complement_rows(rows):
+    return rows[..., ::-1] ^ 1
+
+# (rule transform, row transform) pairs, all of them involutions
+symmetries = [(mirror_rule, mirror_rows), (complement_rule, complement_rows),
+              (mirror_complement_rule, mirror_complement_rows)]
+
+# the k with transform(data) == np.roll(data, k), or None
+def find_rotation(data, transformed):
+    data = np.asarray(data, dtype=np.uint8)
+    pos = (data.tobytes() * 2).find(np.asarray(transformed, dtype=np.uint8).tobytes())
+    if pos < 0:
+        return None
+    return -pos % len(data)
+
+# For rule R and a symmetry T, T(history of R from T(x)) is the history of T(R) from x.
+# When T(x) is a rotation of x the history of R from T(x) is the rotated history of R,
+# so T(R) can be derived from R. Returns (rules to evolve, {rule: (source rule, row transform, k)}).
+def plan_symmetry_sweep(rule_nums, data_list):
+    valid = list()
+    for rule_transform, row_transform in symmetries:
+        k = find_rotation(data_list, row_transform(np.asarray(data_list, dtype=np.uint8)))
+        if k is not None:
+            valid.append((rule_transform, row_transform, k))
+    evolved = list()
+    derived = dict()
+    for rule_num in rule_nums:
+        for rule_transform, row_transform, k in valid:
+            source = rule_transform(rule_num)
+            if source in evolved:
+                derived[rule_num] = (source, row_transform, k)
+                break
+        else:
+            evolved.append(rule_num)
+    return evolved, derived
+
+def cache_path(rule_num, data_list, evolution_max):
+    key = hashlib.blake2b(digest_size=16)
+    key.update(b'%d %d %d %d %d ' % (rule_num, Config.scale, evolution_max, Config.detect_cycle, Config.continue_cycle))
+    key.update(np.asarray(data_list, dtype=np.uint8).tobytes())
+    return os.path.join(Config.cache_dir, key.hexdigest() + '.npz')
+
+# Collects the rows of one rule as packed bits in a temporary file while it is evolved,
+# save() then writes the cache file from there. The cache file is written under a temporary
+# name and renamed into place, so readers never see a partly written file.
+class CacheWriter():
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(dir=Config.history_dir)
+        self._rows = 0
+        self._row_bytes = 0
+
+    def write_rows(self, rows):
+        packed = np.packbits(rows, axis=1)
+        self._row_bytes = packed.shape[1]
+        self._file.write(packed.tobytes())
+        self._rows += len(packed)
+
+    def save(self, path, cycle):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file.flush()
+        rows = np.memmap(self._file, dtype=np.uint8, mode='r', shape=(self._rows, self._row_bytes))
+        output = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False)
+        try:
+            with output:
+                np.savez(output, rows=rows, cycle=np.array((-1, -1) if cycle is None else cycle))
+            os.replace(output.name, path)
+        except:
+            os.remove(output.name)
+            raise
+        finally:
+            del rows
+
+    def close(self):
+        self._file.close()
+
+# the rows of a cache file in blocks of block_rows, read without loading the whole file
+def read_cached_rows(path, scale, block_rows):
+    with zipfile.ZipFile(path) as archive, archive.open('rows.npy') as data:
+        version = np.lib.format.read_magic(data)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(data)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(data)
+        rows, row_bytes = shape
+        while rows > 0:
+            count = min(block_rows, rows)
+            block = np.frombuffer(data.read(count * row_bytes), dtype=np.uint8).reshape(count, row_bytes)
+            yield np.unpackbits(block, axis=1)[:, :scale]
+            rows -= count
+
+# sweep_rules with the on-disk cache and symmetry deduplication, yields the same
+# (rule index, rows, cycle) items for every rule of rule_nums
+def sweep_rules_cached(rule_nums, data_list, evolution_max, abort = None):
+    scale = len(data_list)
+    missing = list()
+    for i in range(len(rule_nums)):
+        path = cache_path(rule_nums[i], data_list, evolution_max) if Config.cache_dir else None
+        if path is None or not os.path.exists(path):
+            missing.append(i)
+            continue
+        with np.load(path) as cached:
+            transient, period = cached['cycle']
+        for rows in read_cached_rows(path, scale, max(1, Config.row_block_bytes // scale)):
+            if abort is not None and abort.is_set():
+                return
+            yield i, rows, None
+        yield i, None, None if period < 0 else (int(transient), int(period))
+    if not missing:
+        return
+
+    missing_rules = [rule_nums[i] for i in missing]
+    if Config.dedup_symmetry:
+        evolved, derived = plan_symmetry_sweep(missing_rules, data_list)
+    else:
+        evolved, derived = missing_rules, dict()
+    print("evolving %d rules, deriving %d by symmetry" % (len(evolved), len(derived)))
+    # (rule index, row transform, k) of the rules each evolved rule stands for
+    targets = [list() for rule_num in evolved]
+    for i in missing:
+        rule_num = rule_nums[i]
+        if rule_num in derived:
+            source, row_transform, k = derived[rule_num]
+            targets[evolved.index(source)].append((i, row_transform, k))
+        else:
+            targets[evolved.index(rule_num)].append((i, None, 0))
+    writers = dict()
+    try:
+        for j, rows, cycle in sweep_rules(evolved, data_list, evolution_max, abort=abort):
+            for i, row_transform, k in targets[j]:
+                if rows is None:
+                    if i in writers:
+                        writer = writers.pop(i)
+                        writer.save(cache_path(rule_nums[i], data_list, evolution_max), cycle)
+                        writer.close()
+                    yield i, None, cycle
+                    continue
+                rule_rows = rows if row_transform is None else row_transform(np.roll(rows, k, axis=1))
+                if Config.cache_dir:
+                    writers.setdefault(i, CacheWriter()).write_rows(rule_rows)
+                yield i, rule_rows, None
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+# evolve one rule with the configured engine, appending a row every Config.record_every
+# generations to history, up to evolution_max generations.
+# With Config.detect_cycle the run stops at the first repeated row and history.cycle
+# is set, counted in rows; with Config.continue_cycle the remaining rows are then
+# replayed from the cycle.
+def evolve_rule(rule_num, history, evolution_max):
+    engine = create_engine(rule_num)
+    state = engine.pack(history.last())
+    seen = {state_digest(state): 0}
+    row_max = evolution_max // Config.record_every
+    row_count = 0
+    while(row_count < row_max):
+        if Config.record_every == 1:
+            state = engine.step(state)
+        else:
+            state = engine.advance(state, Config.record_every)
+        history.append(engine.unpack(state))
+        row_count += 1
+        if not Config.detect_cycle:
+            continue
+        digest = state_digest(state)
+        if digest not in seen:
+            seen[digest] = row_count
+            continue
+        transient = seen[digest]
+        period = row_count - transient
+        history.cycle = (transient, period)
+        if Config.continue_cycle:
+            replay_cycle(engine, state, period, history, row_max - row_count)
+        return
+
+# append remaining rows of a cycle, state is the current state and cycle[i] is i rows ahead
+def replay_cycle(engine, state, period, history, remaining):
+    cycle = list(history.rows(period + 1))
+    if len(cycle) == period + 1:
+        cycle = np.asarray(cycle[:period])
+    else:
+        # the history does not keep a whole period, compute it once
+        cycle = [engine.unpack(state)]
+        for i in range(period - 1):
+            state = engine.advance(state, Config.record_every)
+            cycle.append(engine.unpack(state))
+        cycle = np.asarray(cycle, dtype=np.uint8)
+    block = max(1, 4096 // period) * period
+    start = 1
+    while start <= remaining:
+        end = min(start + block, remaining + 1)
+        history.extend(cycle[np.arange(start, end) % period])
+        start = end
+
+# Config settings a single-rule run reads. Pool processes get them as an argument: a process
+# started with spawn imports this module again and would see the defaults, not the command line.
+rule_setting_names = ('scale', 'evolution_max', 'engine', 'radius', 'states', 'totalistic',
+                      'block_generations', 'record_every', 'detect_cycle', 'continue_cycle', 'history_dir')
+
+def rule_settings():
+    return tuple(getattr(Config, name) for name in rule_setting_names)
+
+# Rows of a single-rule run, written to a file in Config.history_dir by the pool process
+# and read back a block at a time by the parent, so a finished run is never held in memory.
+# Rows of 0/1 are packed to bits, cells with more states take a byte.
+class RowSpool():
+    def __init__(self):
+        self._cells = Config.scale
+        self._packed = Config.states == 2
+        self._row_bytes = (self._cells + 7) // 8 if self._packed else self._cells
+        fd, self.path = tempfile.mkstemp(suffix='.rows', dir=Config.history_dir)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write_row(self, row):
+        self.write_rows(np.asarray(row, dtype=np.uint8)[None, :])
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        self._file.write((np.packbits(rows, axis=1) if self._packed else rows).tobytes())
+
+    # closed spools are sent back to the parent
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # the rows in blocks of at most block_rows, the file is removed afterwards
+    def read_blocks(self, block_rows):
+        try:
+            with open(self.path, 'rb') as data:
+                while True:
+                    block = data.read(block_rows * self._row_bytes)
+                    if not block:
+                        break
+                    block = np.frombuffer(block, dtype=np.uint8).reshape(-1, self._row_bytes)
+                    yield np.unpackbits(block, axis=1)[:, :self._cells] if self._packed else block
+        finally:
+            self.remove()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# single-rule run in a pool process, settings is rule_settings() of the submitting process.
+# Returns the closed RowSpool of the rows and the cycle.
+def compute_rule(rule_num, data_list, settings):
+    for name, value in zip(rule_setting_names, settings):
+        setattr(Config, name, value)
+    spool = RowSpool()
+    try:
+        history = StreamHistory(spool)
+        history.append(data_list)
+        evolve_rule(rule_num, history, Config.evolution_max)
+    except:
+        spool.close()
+        spool.remove()
+        raise
+    spool.close()
+    return spool, history.cycle
+
+# evolve every rule in Config.rule_nums into a history from new_history(rule_num),
+# starting from data_list, and yield (rule_num, history) when the rule is finished.
+# A sweep streams its blocks of rows into the histories of all rules at once and yields
+# the rules as they finish. Single-rule runs go to a process pool, at most
+# Config.pipeline_depth rules ahead. Once the abort event is set no further rows are computed
+# or read and no further rule is yielded.
+def generate_histories(data_list, new_history, abort = None):
+    if sweeping():
+        print("sweeping %d rules" % len(Config.rule_nums))
+        histories = dict()
+        try:
+            for rule_index, rows, cycle in sweep_rules_cached(Config.rule_nums, data_list, Config.evolution_max, abort):
+                rule_num = Config.rule_nums[rule_index]
+                if rule_index not in histories:
+                    histories[rule_index] = new_history(rule_num)
+                if rows is not None:
+                    histories[rule_index].extend(rows)
+                    continue
+                history = histories.pop(rule_index)
+                history.cycle = cycle
+                yield rule_num, history
+        finally:
+            # unfinished rules of an aborted sweep
+            for history in histories.values():
+                close_history(history)
+        return
+
+    processes = min(Config.processes or os.cpu_count() or 1, len(Config.rule_nums))
+    if processes <= 1:
+        for rule_num in Config.rule_nums:
+            if abort is not None and abort.is_set():
+                return
+            history = new_history(rule_num)
+            history.append(data_list)
+            evolve_rule(rule_num, history, Config.evolution_max)
+            yield rule_num, history
+        return
+
+    pool = concurrent.futures.ProcessPoolExecutor(processes)
+    settings = rule_settings()
+    try:
+        rule_nums = iter(Config.rule_nums)
+        pending = collections.deque()
+        for rule_num in itertools.islice(rule_nums, processes + Config.pipeline_depth):
+            pending.append((rule_num, pool.submit(compute_rule, rule_num, data_list, settings)))
+        while pending:
+            rule_num, future = pending[0]
+            spool, cycle = future.result()
+            pending.popleft()
+            for next_rule_num in itertools.islice(rule_nums, 1):
+                pending.append((next_rule_num, pool.submit(compute_rule, next_rule_num, data_list, settings)))
+            if abort is not None and abort.is_set():
+                spool.remove()
+                return
+            history = new_history(rule_num)
+            blocks = spool.read_blocks(max(1, Config.row_block_bytes // Config.scale))
+            for rows in blocks:
+                if abort is not None and abort.is_set():
+                    blocks.close()
+                    close_history(history)
+                    return
+                history.extend(rows)
+            history.cycle = cycle
+            yield rule_num, history
+    finally:
+        pool.shutdown(cancel_futures=True)
+        # spools of rules computed but not read
+        for rule_num, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                future.result()[0].remove()
+
+# drop a history that is not finished or not encoded
+def close_history(history):
+    if history.writer is not None:
+        history.writer.close()
+    history.close()
+
+# rows of the history of one rule, the initial row included
+def run_rows():
+    return Config.evolution_max // (1 if sweeping() else Config.record_every) + 1
+
+# whether histories of Config.history_mode still hold every row once the rule is finished
+def history_keeps_run():
+    if Config.history_mode == HistoryMode.stream:
+        return False
+    if Config.history_mode == HistoryMode.ring:
+        return Config.history_rows >= run_rows()
+    return True
+
+def new_rule_image(rule_num):
+    return ImageWriter(rule_image_name(rule_num), Config.scale, run_rows())
+
+def write_history_image(rule_num, history):
+    with new_rule_image(rule_num) as writer:
+        rows = history.rows()
+        block = list(itertools.islice(rows, 1024))
+        while block:
+            writer.write_rows(block)
+            block = list(itertools.islice(rows, 1024))
+
+# Compute -> encode pipeline. The calling thread computes the histories and puts them on a
+# bounded queue, Config.encoder_threads threads take them off and write the images, so
+# rule N is encoded while rules N + 1 ... are computed. A full queue blocks the compute side.
+# Stream histories and rings shorter than a run do not keep whole runs, so their images are
+# encoded while they are computed instead. on_history(rule_num, history) is called for every
+# finished rule.
+class RulePipeline():
+    def __init__(self, data_list, on_history = None, on_start = None):
+        self._data_list = data_list
+        self._on_history = on_history
+        self._on_start = on_start
+        self._queue = queue.Queue(Config.pipeline_depth)
+        self._abort = Event()
+
+    def abort(self):
+        self._abort.set()
+
+    # returns False if aborted
+    def run(self):
+        inline = not history_keeps_run()
+        encoders = list()
+        if not inline:
+            for i in range(Config.encoder_threads):
+                encoders.append(Thread(target=self._encode))
+                encoders[-1].start()
+        histories = generate_histories(self._data_list, lambda rule_num: self._new_history(rule_num, inline), self._abort)
+        try:
+            for rule_num, history in histories:
+                if inline:
+                    history.writer.close()
+                elif not self._put((rule_num, history)):
+                    close_history(history)
+                    break
+                if self._on_history is not None:
+                    self._on_history(rule_num, history)
+                if self._abort.is_set():
+                    break
+        finally:
+            histories.close()
+            for encoder in encoders:
+                self._put(None)
+            for encoder in encoders:
+                encoder.join()
+            self._discard()
+        return not self._abort.is_set()
+
+    # on_start(rule_num, history) sees the history before its rows are computed
+    def _new_history(self, rule_num, inline):
+        history = create_history(new_rule_image(rule_num) if inline else None)
+        if self._on_start is not None:
+            self._on_start(rule_num, history)
+        return history
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._abort.is_set():
+                    return False
+
+    def _encode(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._abort.is_set():
+                    self._discard()
+                    return
+                continue
+            if item is None:
+                return
+            if self._abort.is_set():
+                close_history(item[1])
+                self._discard()
+                return
+            write_history_image(*item)
+
+    # close the histories left on the queue of an aborted run
+    def _discard(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                close_history(item[1])
+
+# write the images of all rules without any window
+def run_headless():
+    pipeline = RulePipeline(initial_data_list(), lambda rule_num, history: print(describe_history(rule_num, history)))
+    pipeline.run()
+
+# per-cell Shannon entropy (bits) of the periodic blocks of block_length cells, over all rows
+def block_entropy(state, block_length):
+    index = np.zeros(state.shape, dtype=np.uint8 if block_length <= 8 else np.intp)
+    for i in range(block_length):
+        index = (index << 1) | np.roll(state, -i, axis=-1)
+    counts = np.bincount(index.ravel(), minlength=1 << block_length)
+    p = counts[counts > 0] / index.size
+    return float(0.0 - (p * np.log2(p)).sum() / block_length)
+
+# Evolve samples random initial conditions of one rule as one (samples x cells) array and yield
+# (density, block entropy, damage) for every generation. Damage is the fraction of cells that
+# differ from a copy of the ensemble with one random cell flipped per sample.
+# Only the current generation is kept, memory does not depend on evolution_max.
+def ensemble_statistics(rule_num, samples, evolution_max, rng = None):
+    rng = np.random.default_rng() if rng is None else rng
+    engine = NumpyEngine(rule_num)
+    state = rng.integers(0, 2, (samples, Config.scale), dtype=np.uint8)
+    damaged = state.copy()
+    damaged[np.arange(samples), rng.integers(0, Config.scale, samples)] ^= 1
+    for i in range(evolution_max + 1):
+        if i > 0:
+            state = engine.step(state)
+            damaged = engine.step(damaged)
+        yield state.mean(), block_entropy(state, Config.entropy_block), (state != damaged).mean()
+
+# write a (generations + 1 x 3) float32 .npy of [density, block entropy, damage] per rule
+def run_ensemble(samples, seed = None):
+    rng = np.random.default_rng(seed)
+    for rule_num in Config.rule_nums:
+        path = os.path.join(Config.image_dir, 'ensemble-%d.npy' % rule_num)
+        statistics = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(Config.evolution_max + 1, 3))
+        i = 0
+        for values in ensemble_statistics(rule_num, samples, Config.evolution_max, rng):
+            statistics[i] = values
+            i += 1
+        print("rule_num = %d, density = %.4f, entropy = %.4f, damage = %.4f" % ((rule_num,) + tuple(statistics[-1])))
+        statistics.flush()
+        del statistics
+
+def describe_history(rule_num, history):
+    if history.cycle is None:
+        return "rule_num = %d, generations = %d" % (rule_num, history.count - 1)
+    return "rule_num = %d, transient = %d, period = %d" % (rule_num, history.cycle[0], history.cycle[1])
+
 # Define notification event for thread completion
 EVT_RESULT_ID = wx.NewIdRef()
 
@@ -98,31 +1219,33 @@ class WorkerThread(Thread):
         self._notify_window = notify_window
         self._want_abort = False
         self._is_train = False
+        self._pipeline = RulePipeline(initial_data_list(), self.show_history, self.show_running)
 
     def run(self):
+        if self._pipeline.run():
+            wx.PostEvent(self._notify_window, ResultEvent("Finished"))
+        else:
+            wx.PostEvent(self._notify_window, ResultEvent("Aborted"))
+
+    # the window picks up new rows of the running rule on its refresh timer
+    def show_running(self, rule_num, history):
         global dataStore
-        for Config.rule_num in range(1, 255):
-            print("working with rule_num = %d" %Config.rule_num)
-            dataStore.reset()
-            Config.rule_str = convert_dec_to_binstr(Config.rule_num, 8)
-            evolution_count = 0
-            while(evolution_count < Config.evolution_max):
-                current_data_list = dataStore.evolution_history[-1]     # the last element of evolution_history
-                new_data_list = list()
-                for i in range(Config.scale):
-                    new_data_list.append(get_evolution_value(i, current_data_list))
-                dataStore.evolution_history.append(new_data_list)
-                evolution_count += 1
-            wx.PostEvent(self._notify_window, ResultEvent(Config.rule_num))
-            while not dataStore.finished:
-                time.sleep(0.01)
-
-            if self._want_abort:
-                wx.PostEvent(self._notify_window, ResultEvent("Aborted"))
-                return
+        Config.rule_num = rule_num
+        Config.rule_str = convert_dec_to_binstr(rule_num, 8)
+        dataStore.evolution_history = history
+
+    # the window shows the latest finished rule, the pipeline does not wait for it
+    def show_history(self, rule_num, history):
+        global dataStore
+        print(describe_history(rule_num, history))
+        Config.rule_num = rule_num
+        Config.rule_str = convert_dec_to_binstr(rule_num, 8)
+        dataStore.evolution_history = history
+        wx.PostEvent(self._notify_window, ResultEvent(describe_history(rule_num, history)))
 
     def abort(self):
         self._want_abort = True
+        self._pipeline.abort()
 
 class MyFrame(wx.Frame):
     def __init__(self, parent):
@@ -167,32 +1290,136 @@ class MyFrame(wx.Frame):
         self.SetSize(Config.scale * Config.grid_size + 17 , Config.evolution_max * Config.grid_size + 88)
         self.Centre()
 
-    #----------------------------------------------------------------------       
+        # offscreen bitmap of the shown rows, one pixel per cell, blitted with zoom and pan
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.canvas = None
+        self.bitmap = None
+        self.shown_history = None
+        self.shown_count = 0
+        self.zoom = Config.grid_size
+        self.pan = [0, 0]       # first shown cell and row
+        self.drag_start = None
+        self.Bind(wx.EVT_MOUSEWHEEL, self.OnMouseWheel)
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+        self.Bind(wx.EVT_LEFT_UP, self.OnLeftUp)
+        self.Bind(wx.EVT_MOTION, self.OnMotion)
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnTimer, self.timer)
+        self.timer.Start(Config.refresh_interval)
+
+    #----------------------------------------------------------------------
+    # RGB of every state, white for 0 to black for states - 1
+    def getPalette(self):
+        levels = 255 - np.arange(Config.states, dtype=np.uint16) * 255 // (Config.states - 1)
+        return np.repeat(levels.astype(np.uint8)[:, None], 3, axis=1)
+
+    #----------------------------------------------------------------------
+    # copy rows added to the shown history since the last call into the bitmap,
+    # returns True if anything changed
+    def updateCanvas(self):
+        global dataStore
+        history = dataStore.evolution_history
+        if history is None:
+            return False
+        rows_max = Config.evolution_max + 1
+        if history is not self.shown_history or self.canvas is None:
+            self.shown_history = history
+            self.shown_count = 0
+            self.canvas_rows = 0
+            self.canvas = np.full((rows_max, Config.scale, 3), 255, dtype=np.uint8)
+            self.bitmap = wx.Bitmap.FromBuffer(Config.scale, rows_max, self.canvas)
+        count = history.count
+        if count <= self.shown_count:
+            return False
+        rows = list(history.rows(min(count - self.shown_count, rows_max)))
+        self.shown_count = count
+        if not rows:
+            return False
+        pixels = self.getPalette()[np.asarray(rows, dtype=np.uint8)]
+        if self.canvas_rows + len(pixels) <= rows_max:
+            # append below the rows already drawn
+            y = self.canvas_rows
+            self.canvas[y : y + len(pixels)] = pixels
+            self.canvas_rows += len(pixels)
+            part = wx.Bitmap.FromBuffer(Config.scale, len(pixels), np.ascontiguousarray(pixels))
+            memory = wx.MemoryDC(self.bitmap)
+            memory.DrawBitmap(part, 0, y)
+            memory.SelectObject(wx.NullBitmap)
+        else:
+            # full, scroll up and rebuild in one go
+            keep = rows_max - len(pixels)
+            self.canvas[:keep] = self.canvas[self.canvas_rows - keep : self.canvas_rows].copy()
+            self.canvas[keep:] = pixels
+            self.canvas_rows = rows_max
+            self.bitmap = wx.Bitmap.FromBuffer(Config.scale, rows_max, self.canvas)
+        return True
+
+    #----------------------------------------------------------------------
+    def OnTimer(self, event):
+        if Config.rule_str is not None and self.updateCanvas():
+            self.Refresh(False)
+
+    #----------------------------------------------------------------------
     def OnPaint(self, e):
+        dc = wx.BufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(255, 255, 255), wx.SOLID))
+        dc.Clear()
         if Config.rule_str is None:
             return
 
-        global dataStore
-        #dc = wx.BufferedPaintDC (self)
-        dc = wx.PaintDC (self)
-        dc.SetPen(wx.Pen(wx.Colour(0, 0, 0), 1, wx.TRANSPARENT))
-        dc.SetBrush(wx.Brush(wx.Colour(0, 0, 0), wx.SOLID))
-        # draw points based on evolution_history
-        y = 0       
-        for data_list in dataStore.evolution_history:
-            x = 0
-            for data in data_list:
-                if(data == 1):
-                    dc.DrawRectangle(x, y, Config.grid_size, Config.grid_size)  # only draw data = 1
-                x += Config.grid_size
-            y += Config.grid_size
-        self.saveDCToFile(str(Config.rule_num) + "-" + Config.rule_str)
-        dataStore.finished = True
+        self.updateCanvas()
+        width, height = self.GetClientSize()
+        self.clampPan()
+        cells = min(Config.scale - self.pan[0], (width + self.zoom - 1) // self.zoom)
+        rows = min(Config.evolution_max + 1 - self.pan[1], (height + self.zoom - 1) // self.zoom)
+        if cells <= 0 or rows <= 0:
+            return
+        memory = wx.MemoryDC(self.bitmap)
+        dc.StretchBlit(0, 0, cells * self.zoom, rows * self.zoom, memory, self.pan[0], self.pan[1], cells, rows)
+        memory.SelectObject(wx.NullBitmap)
+
+    #----------------------------------------------------------------------
+    def clampPan(self):
+        width, height = self.GetClientSize()
+        self.pan[0] = max(0, min(self.pan[0], Config.scale - width // self.zoom))
+        self.pan[1] = max(0, min(self.pan[1], Config.evolution_max + 1 - height // self.zoom))
+
+    #----------------------------------------------------------------------
+    # wheel zooms around the mouse position
+    def OnMouseWheel(self, event):
+        x, y = event.GetPosition()
+        cell_x = self.pan[0] + x // self.zoom
+        cell_y = self.pan[1] + y // self.zoom
+        if event.GetWheelRotation() > 0:
+            self.zoom = min(self.zoom * 2, Config.zoom_max)
+        else:
+            self.zoom = max(self.zoom // 2, 1)
+        self.pan = [cell_x - x // self.zoom, cell_y - y // self.zoom]
+        self.Refresh(False)
+
+    #----------------------------------------------------------------------
+    def OnLeftDown(self, event):
+        self.drag_start = (event.GetPosition(), list(self.pan))
+
+    #----------------------------------------------------------------------
+    def OnLeftUp(self, event):
+        self.drag_start = None
+
+    #----------------------------------------------------------------------
+    # drag pans the view
+    def OnMotion(self, event):
+        if self.drag_start is None or not event.Dragging():
+            return
+        start, pan = self.drag_start
+        position = event.GetPosition()
+        self.pan = [pan[0] - (position[0] - start[0]) // self.zoom, pan[1] - (position[1] - start[1]) // self.zoom]
+        self.Refresh(False)
 
      #----------------------------------------------------------------------   
     def onExit(self, event):
         if self.worker:
             self.worker.abort()
+        self.timer.Stop()
         self.Close()
 
     #----------------------------------------------------------------------
@@ -238,21 +1465,53 @@ class MyFrame(wx.Frame):
         if(event.data == "Stopped"):
             self.worker = None
             self.startMenuItem.Enable(True)
-            self.stopMenuItem.Enable(False)           
-
-    #----------------------------------------------------------------------
-    def saveDCToFile(self, name):
-        context = wx.ClientDC( self )
-        memory = wx.MemoryDC( )
-        x, y = self.ClientSize
-        bitmap = wx.Bitmap( x, y, -1 )
-        memory.SelectObject( bitmap )
-        memory.Blit( 0, 0, x, y, context, 0, 0)
-        memory.SelectObject( wx.NullBitmap)
-        bitmap.SaveFile(name + '.jpg', wx.BITMAP_TYPE_JPEG )    
+            self.stopMenuItem.Enable(False)
 
 
 def main():
+    parser = argparse.ArgumentParser(description = 'Elementary cellular automata')
+    parser.add_argument('--headless', action = 'store_true', help = 'write rule images without opening a window')
+    parser.add_argument('--format', choices = ['png', 'pbm'], default = Config.image_format, help = 'image format')
+    parser.add_argument('--cell-size', type = int, default = Config.grid_size, help = 'pixels per cell')
+    parser.add_argument('--output', default = Config.image_dir, help = 'image directory')
+    parser.add_argument('--continue', dest = 'continue_cycle', action = 'store_true',
+                        help = 'after a state repeats, fill the remaining rows by replaying the cycle')
+    parser.add_argument('--engine', choices = [e.name for e in Engine], default = Config.engine.name,
+                        help = 'stepping engine, any but numpy runs rule by rule')
+    parser.add_argument('--no-sweep', dest = 'sweep', action = 'store_false',
+                        help = 'evolve the rules one by one instead of together')
+    parser.add_argument('--record-every', type = int, default = Config.record_every,
+                        help = 'keep every n-th generation of single-rule runs')
+    parser.add_argument('--initial', choices = ['ones', 'alternating', 'random'], default = Config.initial_pattern,
+                        help = 'initial condition')
+    parser.add_argument('--ensemble', type = int, metavar = 'SAMPLES',
+                        help = 'write per-generation statistics of SAMPLES random initial conditions per rule')
+    parser.add_argument('--seed', type = int, help = 'random seed of ensemble mode')
+    parser.add_argument('--rule', type = int, action = 'append', help = 'rule number, can be repeated (default: 0-255)')
+    parser.add_argument('--radius', type = int, default = Config.radius, help = 'neighbourhood radius of the general engine')
+    parser.add_argument('--states', type = int, default = Config.states, help = 'states per cell of the general engine')
+    parser.add_argument('--totalistic', action = 'store_true', help = 'totalistic rules for the general engine')
+    args = parser.parse_args()
+    if args.rule:
+        Config.rule_nums = args.rule
+    Config.radius = args.radius
+    Config.states = args.states
+    Config.totalistic = args.totalistic
+    Config.initial_pattern = args.initial
+    Config.continue_cycle = args.continue_cycle
+    Config.engine = Engine[args.engine]
+    Config.sweep = args.sweep
+    Config.record_every = args.record_every
+    Config.image_format = args.format
+    Config.grid_size = args.cell_size
+    Config.image_dir = args.output
+    if args.ensemble:
+        run_ensemble(args.ensemble, args.seed)
+        return
+    if args.headless:
+        run_headless()
+        return
+
     app = wx.App()
     mainWnd = MyFrame(None)
     mainWnd.Show()
@@ -7,12 +7,33 @@ import numpy as np
 from enum import Enum, unique
 import random
 import itertools
+import functools
+import os
+import re
+import mmap
+import zlib
+import bisect
+import hashlib
+import collections
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
 
 @unique
 class CellStatus(Enum):
     dead = 0
     alive = 1
 
+@unique
+class Engine(Enum):
+    python = 0      # per-cell reference implementation
+    numpy = 1       # uint8 grid, neighbour sums from rolls
+    bitpacked = 2   # 64 cells of a column (y) per uint64 word, bit-sliced neighbour counts
+    hashlife = 3    # memoised quadtree on an unbounded plane, shows [0, scale_x) x [0, scale_y)
+    active = 4      # numpy, but only on tiles near last generation's changes
+    parallel = 5    # bands of rows (x) stepped by worker processes in shared memory
+    sparse = 6      # unbounded plane of chunks allocated around live cells, shows the view window
+
 
 class Config():
     scale_x = 12
@@ -22,15 +43,181 @@ class Config():
     Color_background = wx.Colour(255, 255, 255) 
     Color_alive = wx.Colour(0, 0, 0)        # black
     Color_dead = wx.Colour(255, 255, 255)   # white
+    Color_dying = wx.Colour(160, 160, 160)  # grey, states past alive of Generations rules
     side_size = 40
 
-    interval = 0.2      # seconds
-    
+    interval = 0.2      # seconds between steps unless max_speed
+    max_speed = False   # step flat out, the window shows the latest frame at fps
+    fps = 30
+    evolution_max = 100 # steps of a run, None = until stopped
+    rule = 'B3/S23'     # Life-like 'B36/S23', Generations 'B2/S/C3', or S/B digits '23/3', '/2/3'
+    engine = Engine.numpy
+    band_rows = 1024    # rows (x) per pass of Engine.bitpacked, bounds its temporaries
+    step_generations = 1            # generations per shown frame
+    tile_size = 32                  # Engine.active tracks changes per tile_size x tile_size cells
+    active_threshold = 0.3          # fraction of active tiles above which Engine.active sweeps the grid
+    processes = None                # worker processes of Engine.parallel, None = one per core
+    chunk_size = 64                 # Engine.sparse allocates chunk_size x chunk_size cells at a time
+    view_x = 0                      # cell shown top left by unbounded engines
+    view_y = 0
+    pattern_file = None             # .rle or .mc file the board starts from, centred on bounded grids
+    rle_block = 1 << 24             # bytes of RLE decoded per numpy pass
+    checkpoint_every = 0            # generations between checkpoints, 0 = none
+    checkpoint_path = 'checkpoint_%06d.rle'    # % generation, .rle or .mc
+    history_budget = 64 << 20       # bytes of frame history kept for rewinding, 0 = no history
+    keyframe_interval = 64          # frames per keyframe, seeking applies up to this many deltas
+    detect_stable = True            # stop a run once the board repeats, shifted or not
+    stable_window = 1024            # frames remembered for that, the longest period found
+    frame_check_cells = 1 << 18     # history and stable checks see every frame of boards up to this many
+                                    # cells, every (cells // frame_check_cells)-th frame of larger bounded ones
+    soup_scale = (32, 32)           # torus of every board of a soup search
+    soup_size = 16                  # random square in the middle of each board
+    soup_density = 0.5
+    soup_batch = 4096               # boards stepped together
+    soup_period_max = 256           # longest period found, gliders come back after 4 * scale
+    soup_generations_max = 5000     # boards still running then are given up
+    hashlife_max_nodes = 1000000    # Engine.hashlife drops unreachable nodes and results above this many of both
+
+# Frames of a run for rewinding and export. Every keyframe_interval-th frame is kept whole
+# (zlib), the ones between as the indices of the cells that changed since the frame before
+# and their XOR. Above Config.history_budget bytes the oldest keyframes go first, together
+# with the deltas that need them. Unbounded planes are kept as their view window.
+# Every frame is charged frame_overhead bytes on top of its data, so frames that change
+# nothing still count against the budget. Large bounded boards keep only every n-th frame
+# (Config.frame_check_cells); frames between kept ones are stepped again from the one before.
+class FrameHistory():
+    frame_overhead = 256    # list slots, generation, delta tuple and array headers
+    _unchanged = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8))    # shared by all frames without changes
+
+    def __init__(self):
+        self.segments = list()      # [generations, shape, keyframe, deltas]
+        self.nbytes = 0
+        self._last = None           # frame appended last
+
+    def empty(self):
+        return not self.segments
+
+    def last_generation(self):
+        return self.segments[-1][0][-1] if self.segments else None
+
+    def append(self, generation, frame):
+        frame = np.array(frame, dtype=np.uint8)
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or segment[1] != frame.shape or len(segment[0]) >= Config.keyframe_interval:
+            keyframe = zlib.compress(frame.tobytes(), 1)
+            self.segments.append([[generation], frame.shape, keyframe, []])
+            self.nbytes += len(keyframe) + self.frame_overhead
+        else:
+            xor = (frame ^ self._last).reshape(-1)
+            cells = np.flatnonzero(xor).astype(np.uint32)
+            segment[0].append(generation)
+            segment[3].append((cells, xor[cells]) if len(cells) else self._unchanged)
+            self.nbytes += cells.nbytes + len(cells) + self.frame_overhead
+        self._last = frame
+        while self.nbytes > Config.history_budget and len(self.segments) > 1:
+            self._drop(0)
+
+    def _drop(self, index):
+        generations, shape, keyframe, deltas = self.segments.pop(index)
+        self.nbytes -= len(keyframe) + sum(cells.nbytes + len(values) for cells, values in deltas)
+        self.nbytes -= len(generations) * self.frame_overhead
+
+    # (generation, frame) of the last frame kept at or before generation
+    def seek(self, generation):
+        index = bisect.bisect_right([segment[0][0] for segment in self.segments], generation) - 1
+        if index < 0:
+            raise Exception('generation %d is not in the history' % generation)
+        generations, shape, keyframe, deltas = self.segments[index]
+        position = bisect.bisect_right(generations, generation) - 1
+        frame = np.frombuffer(zlib.decompress(keyframe), dtype=np.uint8).reshape(shape).copy()
+        flat = frame.reshape(-1)
+        for cells, values in deltas[:position]:
+            flat[cells] ^= values
+        return generations[position], frame
+
+    # frame of any generation from the first kept one to the last
+    def frame_at(self, generation):
+        kept, frame = self.seek(generation)
+        if kept < generation:
+            engine = NumpyEngine()
+            frame = engine.unpack(engine.advance(engine.pack(frame), generation - kept))
+        return frame
+
+    # the generation offset frames of step_generations away from generation, None past either end
+    def step(self, generation, offset):
+        if not self.segments:
+            return None
+        generation += offset * Config.step_generations
+        if generation < self.segments[0][0][0] or generation > self.last_generation():
+            return None
+        return generation
+
+    # forget the frames after generation, runs continued from a rewound frame replace them
+    def truncate(self, generation):
+        while self.segments and self.segments[-1][0][0] > generation:
+            self._drop(len(self.segments) - 1)
+        if not self.segments:
+            self._last = None
+            return
+        generations, shape, keyframe, deltas = self.segments[-1]
+        keep = bisect.bisect_right(generations, generation)
+        for cells, values in deltas[keep - 1:]:
+            self.nbytes -= cells.nbytes + len(values)
+        self.nbytes -= (len(generations) - keep) * self.frame_overhead
+        del generations[keep:]
+        del deltas[keep - 1:]
+        self._last = self.seek(generations[-1])[1]
+
+    # (generation, frame) of the frames from first to last, decoded one after the other,
+    # frames that were not kept stepped again from the one before
+    def frames(self, first, last):
+        previous = None
+        for generations, shape, keyframe, deltas in list(self.segments):
+            if generations[0] > last:
+                break
+            frame = np.frombuffer(zlib.decompress(keyframe), dtype=np.uint8).reshape(shape).copy()
+            flat = frame.reshape(-1)
+            for i in range(len(generations)):
+                if i:
+                    cells, values = deltas[i - 1]
+                    flat[cells] ^= values
+                if previous is not None and generations[i] - previous[0] > Config.step_generations:
+                    for generation, between in step_frames(previous[1], previous[0], generations[i]):
+                        if first <= generation <= last:
+                            yield generation, between
+                if first <= generations[i] <= last:
+                    yield generations[i], frame
+                previous = (generations[i], frame.copy())
+
+    # path % generation for every kept frame from first to last, returns how many
+    def export(self, path, first, last):
+        count = 0
+        for generation, frame in self.frames(first, last):
+            write_pattern(path % generation, frame)
+            count += 1
+        return count
+
+# (generation, frame) of the generations after start and before end, stepped from frame
+def step_frames(frame, start, end):
+    engine = NumpyEngine()
+    state = engine.pack(frame)
+    for generation in range(start + Config.step_generations, end, Config.step_generations):
+        state = engine.advance(state, Config.step_generations)
+        yield generation, engine.unpack(state)
+
 class DataStore():
     def __init__(self):
         self.reset()
     #----------------------------------------------------------------------
     def reset(self):
+        self.generation = 0
+        self.history = FrameHistory()
+        self.stable = None      # StableResult of the last run, if it stabilised
+        # the engine reads the whole pattern itself on the next start
+        self.pattern_file = Config.pattern_file
+        if self.pattern_file:
+            self.gridInfos = read_pattern_grid(self.pattern_file)
+            return
         self.gridInfos = [[ CellStatus.dead.value for col in range(Config.scale_y) ] for row in range(Config.scale_x) ]
         self.gridInfos[3][1] = CellStatus.alive.value
         self.gridInfos[1][2] = CellStatus.alive.value
@@ -95,13 +282,1226 @@ def get_next_status(x, y, gridInfos):
         dead_count += 1
     neighbour_info = [alive_count, dead_count]
 
-    if(gridInfos[x][y] == CellStatus.dead.value):
-        if(neighbour_info[0] == 3):
-            return CellStatus.alive.value
+    state = gridInfos[x][y]
+    block_sum = neighbour_info[0] + (1 if state == CellStatus.alive.value else 0)
+    return int(compile_rule(Config.rule)[state][block_sum])
+
+# Rulestrings give the neighbour counts a dead cell is born with (B) and an alive cell survives
+# with (S). Generations rules add a number of states C: a cell that does not survive goes
+# through the states 2 .. C-1 before it is dead again, and only state 1 counts as alive.
+def parse_rule(rulestring):
+    birth = None
+    survival = None
+    states = 2
+    parts = rulestring.strip().upper().split('/')
+    try:
+        if any(part[:1].isalpha() for part in parts):
+            for part in parts:
+                if part[:1] == 'B':
+                    birth = part[1:]
+                elif part[:1] == 'S':
+                    survival = part[1:]
+                elif part[:1] in ('C', 'G'):
+                    states = int(part[1:])
+                else:
+                    raise ValueError(part)
+        else:
+            # S/B or S/B/C
+            survival, birth = parts[0], parts[1]
+            if len(parts) > 2:
+                states = int(parts[2])
+        if birth is None or survival is None or len(parts) > 3 or not 2 <= states <= 256:
+            raise ValueError(rulestring)
+        birth = {int(digit) for digit in birth}
+        survival = {int(digit) for digit in survival}
+    except (ValueError, IndexError):
+        raise Exception('invalid rule %s' % rulestring)
+    if max(birth | survival, default=0) > 8:
+        raise Exception('invalid rule %s' % rulestring)
+    return birth, survival, states
+
+# table[state][block_sum] is the next state, block_sum being the 3x3 sum of alive cells
+# including the cell itself, which is what the vectorized engines compute
+@functools.lru_cache(maxsize=None)
+def compile_rule(rulestring):
+    birth, survival, states = parse_rule(rulestring)
+    table = np.zeros((states, 10), dtype=np.uint8)
+    for count in range(9):
+        table[CellStatus.dead.value][count] = CellStatus.alive.value if count in birth else CellStatus.dead.value
+        if count in survival:
+            table[CellStatus.alive.value][count + 1] = CellStatus.alive.value
+        else:
+            table[CellStatus.alive.value][count + 1] = 2 % states
+        for state in range(2, states):
+            table[state][count] = (state + 1) % states
+    return table
+
+# grid of what is shown, the view window of unbounded planes
+def shown_window(cells):
+    if isinstance(cells, SparsePlane):
+        return cells.get_grid(Config.view_x, Config.view_y, Config.scale_x, Config.scale_y)
+    return np.array(cells, dtype=np.uint8)
+
+# Engines share one interface: pack() turns gridInfos into the engine state, step() computes
+# the next generation and unpack() gives back a grid indexed [x][y], or the SparsePlane, for drawing.
+# advance() computes several generations when the ones in between are not needed.
+class StepEngine():
+    def advance(self, state, generations):
+        for i in range(generations):
+            state = self.step(state)
+        return state
+
+    # release what pack() acquired
+    def close(self, state):
+        pass
+
+    # pattern files (.rle or .mc)
+    def load(self, path):
+        return self.pack(read_pattern_grid(path))
+
+    def save(self, path, state):
+        write_pattern(path, self.unpack(state))
+
+class PythonEngine(StepEngine):
+    def pack(self, gridInfos):
+        return [list(row) for row in gridInfos]
+
+    def unpack(self, state):
+        return state
+
+    def step(self, state):
+        new_gridInfos = [[ 0 for col in range(Config.scale_y) ] for row in range(Config.scale_x) ]
+        for x in range(Config.scale_x):
+            for y in range(Config.scale_y):
+                new_gridInfos[x][y] = get_next_status(x, y, state)
+        return new_gridInfos
+
+class NumpyEngine(StepEngine):
+    def __init__(self):
+        self._table = compile_rule(Config.rule)
+
+    def pack(self, gridInfos):
+        return np.array(gridInfos, dtype=np.uint8)
+
+    def unpack(self, state):
+        return state
+
+    def step(self, state):
+        # 3x3 sums on the torus, same wrap as get_next_status
+        alive = alive_cells(state, self._table)
+        column_sum = alive + np.roll(alive, 1, axis=0) + np.roll(alive, -1, axis=0)
+        block_sum = column_sum + np.roll(column_sum, 1, axis=1) + np.roll(column_sum, -1, axis=1)
+        return life_rule(block_sum, state, self._table)
+
+# the cells counted as neighbours, every non-zero cell of two state rules
+def alive_cells(state, table):
+    if len(table) == 2:
+        return state
+    return (state == CellStatus.alive.value).view(np.uint8)
+
+# table[state][block_sum] for every cell, taken in slices so the index stays in cache
+def life_rule(block_sum, state, table):
+    if table.size > 256:
+        index = state.astype(np.uint16) * np.uint16(table.shape[1])
     else:
-        if(neighbour_info[0] < 2 or neighbour_info[0] > 3):
-            return CellStatus.dead.value
-    return gridInfos[x][y]
+        index = state * np.uint8(table.shape[1])
+    index += block_sum
+    index = index.reshape(-1)
+    new_state = np.empty(index.shape, dtype=np.uint8)
+    flat = table.reshape(-1)
+    for start in range(0, len(index), 65536):
+        np.take(flat, index[start:start + 65536], out=new_state[start:start + 65536])
+    return new_state.reshape(state.shape)
+
+# Only the tiles that changed last generation and their neighbours are recomputed, the grid is
+# updated in place. Above Config.active_threshold of the tiles active a full sweep is cheaper.
+class ActiveEngine(StepEngine):
+    def __init__(self):
+        self._size = Config.tile_size
+        self._tiles_x = -(-Config.scale_x // self._size)
+        self._tiles_y = -(-Config.scale_y // self._size)
+        self._offsets = np.arange(-1, self._size + 1)
+        self._full = NumpyEngine()
+        self._table = compile_rule(Config.rule)
+
+    # state is the grid and the mask of tiles to recompute
+    def pack(self, gridInfos):
+        return np.array(gridInfos, dtype=np.uint8), np.ones((self._tiles_x, self._tiles_y), dtype=bool)
+
+    def unpack(self, state):
+        return state[0]
+
+    def _tiles_of(self, changed):
+        size = self._size
+        padded = np.zeros((self._tiles_x * size, self._tiles_y * size), dtype=bool)
+        padded[:Config.scale_x, :Config.scale_y] = changed
+        return padded.reshape(self._tiles_x, size, self._tiles_y, size).any(axis=(1, 3))
+
+    def step(self, state):
+        grid, active = state
+        tile_x, tile_y = np.nonzero(active)
+        if len(tile_x) > Config.active_threshold * active.size:
+            new_grid = self._full.step(grid)
+            changed = self._tiles_of(new_grid != grid)
+        else:
+            # every active tile with a one cell halo, wrapped like get_next_status; cells of
+            # the last tiles past the edge wrap onto real cells and get the same values
+            xs = (tile_x[:, None] * self._size + self._offsets) % Config.scale_x
+            ys = (tile_y[:, None] * self._size + self._offsets) % Config.scale_y
+            blocks = grid[xs[:, :, None], ys[:, None, :]]
+            alive = alive_cells(blocks, self._table)
+            column_sum = alive[:, :-2] + alive[:, 1:-1] + alive[:, 2:]
+            block_sum = column_sum[:, :, :-2] + column_sum[:, :, 1:-1] + column_sum[:, :, 2:]
+            centre = blocks[:, 1:-1, 1:-1]
+            new_blocks = life_rule(block_sum, centre, self._table)
+            tile, cell_x, cell_y = np.nonzero(new_blocks != centre)
+            x = xs[tile, cell_x + 1]
+            y = ys[tile, cell_y + 1]
+            new_grid = grid
+            new_grid[x, y] = new_blocks[tile, cell_x, cell_y]
+            changed = np.zeros_like(active)
+            changed[x // self._size, y // self._size] = True
+        # a change reaches at most the neighbouring tiles in the next generation
+        rows = changed | np.roll(changed, 1, axis=0) | np.roll(changed, -1, axis=0)
+        return new_grid, rows | np.roll(rows, 1, axis=1) | np.roll(rows, -1, axis=1)
+
+def full_adder(a, b, c):
+    a_xor_b = a ^ b
+    return a_xor_b ^ c, (a & b) | (c & a_xor_b)
+
+def half_adder(a, b):
+    return a ^ b, a & b
+
+# Neighbour counts of 64 cells per word operation: the 8 neighbour bit planes are summed with
+# full adders into the count bits (1, 2, 4, 8) of every cell.
+class BitPackedEngine(StepEngine):
+    _one = np.uint64(1)
+    _top = np.uint64(63)
+
+    def __init__(self):
+        birth, survival, states = parse_rule(Config.rule)
+        if states != 2:
+            raise Exception('bitpacked engine only runs two state rules, not %s' % Config.rule)
+        self._birth = birth
+        self._survival = survival
+        self._last_bit = np.uint64((Config.scale_y - 1) % 64)
+        self._words = (Config.scale_y + 63) // 64
+        tail = Config.scale_y % 64
+        self._last_mask = np.uint64((1 << tail) - 1) if tail else ~np.uint64(0)
+
+    # cell [x][y] is bit (y % 64) of word [x][y // 64], padding bits are kept zero
+    def pack(self, gridInfos):
+        data = np.packbits(np.asarray(gridInfos, dtype=np.uint8), axis=1, bitorder='little')
+        words = np.zeros((len(data), self._words * 8), dtype=np.uint8)
+        words[:, :data.shape[1]] = data
+        return words.view('<u8').astype(np.uint64)
+
+    def unpack(self, state):
+        data = state.astype('<u8').view(np.uint8)
+        return np.unpackbits(data, axis=1, bitorder='little')[:, :Config.scale_y]
+
+    # bit y is cell y - 1, wrapped like pre_y
+    def _previous(self, rows):
+        shifted = rows << self._one
+        shifted[:, 1:] |= rows[:, :-1] >> self._top
+        shifted[:, 0] |= (rows[:, -1] >> self._last_bit) & self._one
+        return shifted
+
+    # bit y is cell y + 1, wrapped like next_y
+    def _next(self, rows):
+        shifted = rows >> self._one
+        shifted[:, :-1] |= rows[:, 1:] << self._top
+        shifted[:, -1] |= (rows[:, 0] & self._one) << self._last_bit
+        return shifted
+
+    def _count(self, above, centre, below):
+        s1, c1 = full_adder(self._previous(above), above, self._next(above))
+        s2, c2 = full_adder(self._previous(below), below, self._next(below))
+        s3, c3 = half_adder(self._previous(centre), self._next(centre))
+        bit0, carry = full_adder(s1, s2, s3)
+        twos, fours_1 = full_adder(c1, c2, c3)
+        bit1 = twos ^ carry
+        fours_2 = twos & carry
+        return bit0, bit1, fours_1 ^ fours_2, fours_1 & fours_2
+
+    # OR of the neighbour counts in the rule, each an AND of the count bits; 8 is bit3 alone
+    def _rule(self, centre, bit0, bit1, bit2, bit3):
+        bits = (bit0, bit1, bit2)
+        inverted = (~bit0, ~bit1, ~bit2)
+        low = ~bit3
+        dead = ~centre
+        result = np.zeros_like(centre)
+        for count in self._birth | self._survival:
+            if count == 8:
+                match = bit3.copy()
+            else:
+                match = low.copy()
+                for i in range(3):
+                    match &= bits[i] if count >> i & 1 else inverted[i]
+            if count not in self._survival:
+                match &= dead
+            elif count not in self._birth:
+                match &= centre
+            result |= match
+        return result
+
+    def step(self, state):
+        new_state = np.empty_like(state)
+        rows = len(state)
+        for start in range(0, rows, Config.band_rows):
+            end = min(start + Config.band_rows, rows)
+            centre = state[start:end]
+            above = state[np.arange(start - 1, end - 1) % rows]
+            below = state[np.arange(start + 1, end + 1) % rows]
+            new_state[start:end] = self._rule(centre, *self._count(above, centre, below))
+        new_state[:, -1] &= self._last_mask
+        return new_state
+
+# Worker of Engine.parallel: steps rows [start, end) from one shared grid into the other, reading
+# the rows next to its band (wrapped like get_next_status) from the grid all workers only read.
+# Runs generations.value generations per round, 0 ends it.
+def band_worker(names, shape, start, end, table, generations, control, step_barrier):
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    grids = [np.ndarray(shape, dtype=np.uint8, buffer=block.buf) for block in blocks]
+    halo = np.arange(start - 1, end + 1) % shape[0]
+    current = 0
+    try:
+        while True:
+            control.wait()
+            count = generations.value
+            if count == 0:
+                break
+            for i in range(count):
+                rows = grids[current][halo]
+                alive = alive_cells(rows, table)
+                column_sum = alive[:-2] + alive[1:-1] + alive[2:]
+                block_sum = column_sum + np.roll(column_sum, 1, axis=1) + np.roll(column_sum, -1, axis=1)
+                grids[1 - current][start:end] = life_rule(block_sum, rows[1:-1], table)
+                current = 1 - current
+                # nobody writes the grid just read until every band has been computed
+                step_barrier.wait()
+            control.wait()
+    finally:
+        del grids
+        for block in blocks:
+            block.close()
+
+# The grid lives twice in shared memory and the workers swap between the two, so frames are
+# never pickled. The state is a view of the current grid, valid until the next step but one.
+class ParallelEngine(StepEngine):
+    def __init__(self):
+        self._processes = min(Config.processes or os.cpu_count() or 1, Config.scale_x)
+        self._workers = list()
+
+    def pack(self, gridInfos):
+        self.close(None)
+        shape = (Config.scale_x, Config.scale_y)
+        self._blocks = [shared_memory.SharedMemory(create=True, size=Config.scale_x * Config.scale_y) for i in range(2)]
+        self._grids = [np.ndarray(shape, dtype=np.uint8, buffer=block.buf) for block in self._blocks]
+        self._grids[0][:] = np.asarray(gridInfos, dtype=np.uint8)
+        self._current = 0
+        self._generations = multiprocessing.Value('q', 0, lock=False)
+        self._control = multiprocessing.Barrier(self._processes + 1)
+        step_barrier = multiprocessing.Barrier(self._processes)
+        names = [block.name for block in self._blocks]
+        table = compile_rule(Config.rule)
+        bounds = np.linspace(0, Config.scale_x, self._processes + 1).astype(int)
+        for i in range(self._processes):
+            worker = multiprocessing.Process(target=band_worker, daemon=True,
+                args=(names, shape, int(bounds[i]), int(bounds[i + 1]), table, self._generations, self._control, step_barrier))
+            worker.start()
+            self._workers.append(worker)
+        return self._grids[0]
+
+    # a copy, the shared grids are unmapped by close() while the window may still show it
+    def unpack(self, state):
+        return np.array(state)
+
+    def step(self, state):
+        return self.advance(state, 1)
+
+    def advance(self, state, generations):
+        if generations:
+            self._generations.value = generations
+            self._control.wait()    # start the round
+            self._control.wait()    # every band done
+            self._current = (self._current + generations) % 2
+        return self._grids[self._current]
+
+    def close(self, state):
+        if not self._workers:
+            return
+        self._generations.value = 0
+        self._control.wait()
+        for worker in self._workers:
+            worker.join()
+        self._workers = list()
+        self._grids = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+# Unbounded plane as a dict of chunks, (cx, cy) -> chunk_size x chunk_size grid of the cells
+# x in [cx * chunk_size, (cx + 1) * chunk_size) and the same for y. Chunks without any
+# non-dead cell are not stored, so a step costs time in the live area only.
+class SparsePlane():
+    def __init__(self):
+        self.size = Config.chunk_size
+        self.chunks = dict()
+        self.generation = 0
+        self._table = compile_rule(Config.rule)
+        if self._table[CellStatus.dead.value][0] != CellStatus.dead.value:
+            raise Exception('sparse engine does not run rule %s' % Config.rule)
+        # (dx, dy, cells of a padded chunk, cells of the neighbour at dx, dy that go there)
+        size = self.size
+        target = {-1: 0, 0: slice(1, size + 1), 1: size + 1}
+        source = {-1: size - 1, 0: slice(None), 1: 0}
+        self._borders = [(dx, dy, (target[dx], target[dy]), (source[dx], source[dy]))
+                         for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+    # grid is indexed [x][y], its cell [0][0] goes to (x0, y0)
+    def set_grid(self, gridInfos, x0 = 0, y0 = 0):
+        self.chunks = dict()
+        self.add_grid(gridInfos, x0, y0)
+
+    # replaces the chunks the grid meets
+    def add_grid(self, gridInfos, x0, y0):
+        cells = np.asarray(gridInfos, dtype=np.uint8)
+        size = self.size
+        for cx in range(x0 // size, (x0 + cells.shape[0] - 1) // size + 1):
+            for cy in range(y0 // size, (y0 + cells.shape[1] - 1) // size + 1):
+                chunk = np.zeros((size, size), dtype=np.uint8)
+                left, top = cx * size - x0, cy * size - y0
+                piece = cells[max(left, 0) : max(left + size, 0), max(top, 0) : max(top + size, 0)]
+                chunk[max(-left, 0) : max(-left, 0) + piece.shape[0], max(-top, 0) : max(-top, 0) + piece.shape[1]] = piece
+                if chunk.any():
+                    self.chunks[(cx, cy)] = chunk
+                else:
+                    self.chunks.pop((cx, cy), None)
+
+    # cells (xs[n], ys[n]) get states[n]
+    def add_cells(self, xs, ys, states):
+        size = self.size
+        if not len(xs):
+            return
+        cx = xs // size
+        cy = ys // size
+        low_x, low_y = cx.min(), cy.min()
+        span = int(cy.max() - low_y) + 1
+        keys, inverse = np.unique((cx - low_x) * span + (cy - low_y), return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        ends = np.cumsum(np.bincount(inverse, minlength=len(keys)))
+        start = 0
+        for n in range(len(keys)):
+            key = (int(keys[n] // span + low_x), int(keys[n] % span + low_y))
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.chunks[key] = np.zeros((size, size), dtype=np.uint8)
+            cells = order[start : ends[n]]
+            chunk[xs[cells] - key[0] * size, ys[cells] - key[1] * size] = states[cells]
+            start = ends[n]
+
+    # (x_min, y_min, x_max, y_max) of the non-dead cells, None when there are none
+    def bounds(self):
+        result = None
+        for (cx, cy), chunk in self.chunks.items():
+            xs = np.flatnonzero(chunk.any(axis=1))
+            ys = np.flatnonzero(chunk.any(axis=0))
+            box = (cx * self.size + xs[0], cy * self.size + ys[0], cx * self.size + xs[-1], cy * self.size + ys[-1])
+            result = box if result is None else (min(result[0], box[0]), min(result[1], box[1]),
+                                                 max(result[2], box[2]), max(result[3], box[3]))
+        return None if result is None else tuple(int(value) for value in result)
+
+    # (x, y, chunk) of the stored chunks meeting the window, x and y of the chunk's first cell
+    def chunks_in(self, x0, y0, width, height):
+        chunks = self.chunks
+        size = self.size
+        for cx in range(x0 // size, (x0 + width - 1) // size + 1):
+            for cy in range(y0 // size, (y0 + height - 1) // size + 1):
+                chunk = chunks.get((cx, cy))
+                if chunk is not None:
+                    yield cx * size, cy * size, chunk
+
+    # the window of width x height cells at (x0, y0), indexed [x][y]
+    def get_grid(self, x0, y0, width, height):
+        grid = np.zeros((width, height), dtype=np.uint8)
+        for x, y, chunk in self.chunks_in(x0, y0, width, height):
+            left, top = max(x, x0), max(y, y0)
+            right, bottom = min(x + self.size, x0 + width), min(y + self.size, y0 + height)
+            grid[left - x0 : right - x0, top - y0 : bottom - y0] = chunk[left - x : right - x, top - y : bottom - y]
+        return grid
+
+    def population(self):
+        return sum(int(np.count_nonzero(chunk == CellStatus.alive.value)) for chunk in self.chunks.values())
+
+    def step(self):
+        chunks = self.chunks
+        # stored chunks, and the empty neighbours next to cells on their edges
+        keys = set(chunks)
+        for (cx, cy), chunk in chunks.items():
+            for dx, dy, target, source in self._borders:
+                # source is what the chunk at -dx, -dy needs of this one
+                if (dx or dy) and chunk[source].any():
+                    keys.add((cx - dx, cy - dy))
+        keys = list(keys)
+        size = self.size
+        blocks = np.zeros((len(keys), size + 2, size + 2), dtype=np.uint8)
+        for n in range(len(keys)):
+            cx, cy = keys[n]
+            block = blocks[n]
+            for dx, dy, target, source in self._borders:
+                neighbour = chunks.get((cx + dx, cy + dy))
+                if neighbour is not None:
+                    block[target] = neighbour[source]
+        alive = alive_cells(blocks, self._table)
+        column_sum = alive[:, :-2] + alive[:, 1:-1] + alive[:, 2:]
+        block_sum = column_sum[:, :, :-2] + column_sum[:, :, 1:-1] + column_sum[:, :, 2:]
+        new_blocks = life_rule(block_sum, blocks[:, 1:-1, 1:-1], self._table)
+        keep = np.nonzero(new_blocks.reshape(len(keys), -1).any(axis=1))[0]
+        self.chunks = {keys[n]: new_blocks[n] for n in keep}
+        self.generation += 1
+
+class SparseEngine(StepEngine):
+    def pack(self, gridInfos):
+        plane = SparsePlane()
+        plane.set_grid(gridInfos)
+        return plane
+
+    def load(self, path):
+        plane = SparsePlane()
+        if path.endswith('.mc'):
+            life = HashLife()
+            read_macrocell(path, life)
+            for x0, y0, band in pattern_bands(life, plane.size):
+                plane.add_grid(band, x0, y0)
+        else:
+            for xs, ys, lengths, states in read_rle(path):
+                plane.add_cells(*run_cells(xs, ys, lengths, states))
+        return plane
+
+    def unpack(self, state):
+        return state
+
+    def step(self, state):
+        state.step()
+        return state
+
+# Quadtree node of level k, covering 2^k x 2^k cells: nw is the quarter with the smaller x and y,
+# ne larger x, sw larger y, se both larger. Level 0 nodes are single cells. Nodes are
+# hash-consed by HashLife, so equal subtrees are the same object and compare by identity.
+class Node():
+    __slots__ = ('k', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, k, nw, ne, sw, se, population):
+        self.k = k
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+
+class HashLife():
+    def __init__(self, max_nodes = None):
+        self.max_nodes = Config.hashlife_max_nodes if max_nodes is None else max_nodes
+        self._table = compile_rule(Config.rule)
+        # empty space has to stay empty and cells to be one bit
+        if len(self._table) != 2 or self._table[CellStatus.dead.value][0] != CellStatus.dead.value:
+            raise Exception('hashlife engine does not run rule %s' % Config.rule)
+        self.dead = Node(0, None, None, None, None, 0)
+        self.alive = Node(0, None, None, None, None, 1)
+        self.clear()
+
+    def clear(self):
+        self._nodes = dict()        # (nw, ne, sw, se) -> node
+        self._results = dict()      # (node, j) -> centre of node after 2^j generations
+        self._empty = [self.dead]
+        self._limit = self.max_nodes    # nodes + results that trigger collect()
+        self.root = self.empty(3)
+        self.origin = [0, 0]        # cell of the root's nw corner
+        self.generation = 0
+
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = Node(nw.k + 1, nw, ne, sw, se, nw.population + ne.population + sw.population + se.population)
+            self._nodes[key] = node
+        return node
+
+    def empty(self, k):
+        while len(self._empty) <= k:
+            e = self._empty[-1]
+            self._empty.append(self.join(e, e, e, e))
+        return self._empty[k]
+
+    #----------------------------------------------------------------------
+    # grid is indexed [x][y], its cell [0][0] goes to (x0, y0)
+    def set_grid(self, gridInfos, x0 = 0, y0 = 0):
+        cells = np.asarray(gridInfos, dtype=np.uint8)
+        k = 3
+        while (1 << k) < max(cells.shape):
+            k += 1
+        square = np.zeros((1 << k, 1 << k), dtype=np.uint8)
+        square[:cells.shape[0], :cells.shape[1]] = cells
+        self.clear()
+        self.root = self._build(square, k)
+        self.origin = [x0, y0]
+
+    # chunk_size has to be a power of two for the chunks to be nodes
+    def set_plane(self, plane):
+        level = plane.size.bit_length() - 1
+        if plane.size != 1 << level:
+            bounds = plane.bounds() or (0, 0, 0, 0)
+            self.set_grid(plane.get_grid(bounds[0], bounds[1], bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1), bounds[0], bounds[1])
+            return
+        self.clear()
+        if not plane.chunks:
+            return
+        # chunk keys from the lowest ones, so that pairing up ends in one node
+        min_x = min(x for x, y in plane.chunks)
+        min_y = min(y for x, y in plane.chunks)
+        nodes = {(x - min_x, y - min_y): self._build(chunk, level) for (x, y), chunk in plane.chunks.items()}
+        # pair up the nodes level by level until one holds them all
+        while len(nodes) > 1:
+            parents = dict()
+            for (x, y) in nodes:
+                parents.setdefault((x >> 1, y >> 1), None)
+            e = self.empty(level)
+            for (x, y) in parents:
+                parents[(x, y)] = self.join(nodes.get((2 * x, 2 * y), e), nodes.get((2 * x + 1, 2 * y), e),
+                                            nodes.get((2 * x, 2 * y + 1), e), nodes.get((2 * x + 1, 2 * y + 1), e))
+            nodes = parents
+            level += 1
+        for (x, y), node in nodes.items():
+            self.root = node
+            self.origin = [min_x * plane.size + (x << level), min_y * plane.size + (y << level)]
+        while self.root.k < 3:
+            self._expand()
+
+    def _build(self, cells, k):
+        if not cells.any():
+            return self.empty(k)
+        if k == 0:
+            return self.alive
+        h = 1 << (k - 1)
+        return self.join(self._build(cells[:h, :h], k - 1), self._build(cells[h:, :h], k - 1),
+                         self._build(cells[:h, h:], k - 1), self._build(cells[h:, h:], k - 1))
+
+    # the window of width x height cells at (x0, y0), indexed [x][y]
+    def get_grid(self, x0, y0, width, height):
+        grid = np.zeros((width, height), dtype=np.uint8)
+        self._paint(grid, self.root, self.origin[0] - x0, self.origin[1] - y0)
+        return grid
+
+    def _paint(self, grid, node, x, y):
+        size = 1 << node.k
+        if node.population == 0 or x >= grid.shape[0] or y >= grid.shape[1] or x + size <= 0 or y + size <= 0:
+            return
+        if node.k == 0:
+            grid[x][y] = 1
+            return
+        h = size >> 1
+        self._paint(grid, node.nw, x, y)
+        self._paint(grid, node.ne, x + h, y)
+        self._paint(grid, node.sw, x, y + h)
+        self._paint(grid, node.se, x + h, y + h)
+
+    # (x_min, y_min, x_max, y_max) of the alive cells, None when there are none
+    def bounds(self):
+        box = self._bounds(self.root, dict())
+        if box is None:
+            return None
+        return (self.origin[0] + box[0], self.origin[1] + box[1], self.origin[0] + box[2], self.origin[1] + box[3])
+
+    # bounds relative to the node's nw corner, memo shares them between equal subtrees
+    def _bounds(self, node, memo):
+        if node.population == 0:
+            return None
+        if node.k == 0:
+            return (0, 0, 0, 0)
+        result = memo.get(node)
+        if result is not None:
+            return result
+        h = 1 << (node.k - 1)
+        for child, dx, dy in ((node.nw, 0, 0), (node.ne, h, 0), (node.sw, 0, h), (node.se, h, h)):
+            box = self._bounds(child, memo)
+            if box is None:
+                continue
+            box = (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+            result = box if result is None else (min(result[0], box[0]), min(result[1], box[1]),
+                                                 max(result[2], box[2]), max(result[3], box[3]))
+        memo[node] = result
+        return result
+
+    #----------------------------------------------------------------------
+    # put the root in the centre of a node one level up
+    def _expand(self):
+        r = self.root
+        e = self.empty(r.k - 1)
+        self.root = self.join(self.join(e, e, e, r.nw), self.join(e, e, r.ne, e),
+                              self.join(e, r.sw, e, e), self.join(r.se, e, e, e))
+        self.origin = [self.origin[0] - (1 << (r.k - 1)), self.origin[1] - (1 << (r.k - 1))]
+
+    # population of the centre quarter (side 2^(k-2)) of the root
+    def _inner_population(self):
+        r = self.root
+        return r.nw.se.se.population + r.ne.sw.sw.population + r.sw.ne.ne.population + r.se.nw.nw.population
+
+    def advance(self, generations):
+        j = 0
+        while generations:
+            if generations & 1:
+                self._step(j)
+            generations >>= 1
+            j += 1
+
+    # 2^j generations. The root is grown until the pattern sits in its centre quarter and
+    # 2^j is at most 1/8 of its side, so nothing can reach past the centre half computed.
+    def _step(self, j):
+        while self.root.k < max(3, j + 3) or self._inner_population() != self.root.population:
+            self._expand()
+        k = self.root.k
+        self.root = self._successor(self.root, j)
+        self.origin = [self.origin[0] + (1 << (k - 2)), self.origin[1] + (1 << (k - 2))]
+        self.generation += 1 << j
+
+    # centre of node (level k - 1) after 2^j generations, j <= k - 2
+    def _successor(self, node, j):
+        j = min(j, node.k - 2)
+        key = (node, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        if node.population == 0:
+            result = node.nw
+        elif node.k == 2:
+            result = self._life_4x4(node)
+        else:
+            a, b, c, d = node.nw, node.ne, node.sw, node.se
+            join = self.join
+            # nine overlapping level k - 1 squares, advanced by 2^j or 2^(k-3) generations
+            c00 = self._successor(a, j)
+            c01 = self._successor(join(a.ne, b.nw, a.se, b.sw), j)
+            c02 = self._successor(b, j)
+            c10 = self._successor(join(a.sw, a.se, c.nw, c.ne), j)
+            c11 = self._successor(join(a.se, b.sw, c.ne, d.nw), j)
+            c12 = self._successor(join(b.sw, b.se, d.nw, d.ne), j)
+            c20 = self._successor(c, j)
+            c21 = self._successor(join(c.ne, d.nw, c.se, d.sw), j)
+            c22 = self._successor(d, j)
+            if j < node.k - 2:
+                # already 2^j generations on, only take the centres
+                result = join(join(c00.se, c01.sw, c10.ne, c11.nw), join(c01.se, c02.sw, c11.ne, c12.nw),
+                              join(c10.se, c11.sw, c20.ne, c21.nw), join(c11.se, c12.sw, c21.ne, c22.nw))
+            else:
+                result = join(self._successor(join(c00, c01, c10, c11), j),
+                              self._successor(join(c01, c02, c11, c12), j),
+                              self._successor(join(c10, c11, c20, c21), j),
+                              self._successor(join(c11, c12, c21, c22), j))
+        self._results[key] = result
+        # also within a step: nodes held by the recursion then lose their entry in the node
+        # table, so equal nodes joined later are new objects, which costs memory but not results
+        if len(self._nodes) + len(self._results) > self._limit:
+            self.collect()
+        return result
+
+    # centre 2x2 of a 4x4 node after one generation
+    def _life_4x4(self, node):
+        cells = np.zeros((4, 4), dtype=np.uint8)
+        for dx, dy, quarter in ((0, 0, node.nw), (2, 0, node.ne), (0, 2, node.sw), (2, 2, node.se)):
+            cells[dx][dy] = quarter.nw.population
+            cells[dx + 1][dy] = quarter.ne.population
+            cells[dx][dy + 1] = quarter.sw.population
+            cells[dx + 1][dy + 1] = quarter.se.population
+        centre = list()
+        for x, y in ((1, 1), (2, 1), (1, 2), (2, 2)):
+            alive = self._table[cells[x][y]][int(cells[x - 1 : x + 2, y - 1 : y + 2].sum())]
+            centre.append(self.alive if alive else self.dead)
+        return self.join(*centre)
+
+    # keep only the nodes reachable from the root and forget all results. If the root alone
+    # needs more than max_nodes, the next collect waits for twice as many, not every new node.
+    def collect(self):
+        reachable = dict()
+        stack = [self.root] + self._empty[1:]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node.k == 0 or id(node) in seen:
+                continue
+            seen.add(id(node))
+            reachable[(node.nw, node.ne, node.sw, node.se)] = node
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+        self._nodes = reachable
+        self._results = dict()
+        self._limit = max(self.max_nodes, 2 * len(reachable))
+
+class HashLifeEngine(StepEngine):
+    def __init__(self):
+        self._life = HashLife()
+
+    def pack(self, gridInfos):
+        self._life.set_grid(gridInfos)
+        return self._life
+
+    def unpack(self, state):
+        return state.get_grid(0, 0, Config.scale_x, Config.scale_y)
+
+    def step(self, state):
+        state.advance(1)
+        return state
+
+    def advance(self, state, generations):
+        state.advance(generations)
+        return state
+
+    def load(self, path):
+        if path.endswith('.mc'):
+            read_macrocell(path, self._life)
+        else:
+            plane = SparsePlane()
+            for xs, ys, lengths, states in read_rle(path):
+                plane.add_cells(*run_cells(xs, ys, lengths, states))
+            self._life.set_plane(plane)
+        return self._life
+
+    def save(self, path, state):
+        write_pattern(path, state)
+
+# RLE: header 'x = 3, y = 3, rule = B3/S23', then runs like '2bo$obo$' ended by '!'. b or . is
+# dead, o alive, A-X the states 1-24 of multi-state rules, with a prefix p-y for 25 upwards;
+# $ ends rows. Runs are decoded with numpy straight from a memory map, a block at a time.
+_rle_header = re.compile(rb'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*([^\s,]+))?')
+
+# width, height, rule (None if not given) and the offset of the runs
+def read_rle_header(path):
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            offset += len(line)
+            if line.startswith(b'#') or not line.strip():
+                continue
+            match = _rle_header.match(line.strip())
+            if not match:
+                break
+            rule = match.group(3).decode() if match.group(3) else None
+            return int(match.group(1)), int(match.group(2)), rule, offset
+    raise Exception('no RLE header in %s' % path)
+
+# blocks of runs (xs, ys, lengths, states) of the non-dead cells
+def read_rle(path):
+    width, height, rule, offset = read_rle_header(path)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= offset:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = data.find(b'!', offset)
+            end = len(data) if end < 0 else end
+            body = np.frombuffer(data, dtype=np.uint8)
+            try:
+                x = y = 0
+                start = offset
+                while start < end:
+                    stop = min(start + Config.rle_block, end)
+                    if stop < end:
+                        # cut after the last tag, counts and prefixes go with the next block
+                        tags = np.flatnonzero(_rle_tags(body[start:stop]))
+                        stop = start + tags[-1] + 1 if len(tags) else end
+                    xs, ys, lengths, states, x, y = _decode_rle_block(body[start:stop], x, y)
+                    start = stop
+                    if len(xs):
+                        yield xs, ys, lengths, states
+            finally:
+                del body
+
+def _rle_tags(data):
+    return ((data == ord('b')) | (data == ord('o')) | (data == ord('.')) | (data == ord('$'))
+            | ((data >= ord('A')) & (data <= ord('X'))))
+
+# runs of one block of whole tokens, rows and columns continue from (x, y)
+def _decode_rle_block(data, x, y):
+    size = len(data)
+    positions = np.arange(size)
+    digit = (data >= ord('0')) & (data <= ord('9'))
+    letter = (data >= ord('A')) & (data <= ord('X'))
+    # a number ends at the first non-digit after it
+    ends = np.minimum.accumulate(np.where(digit, size, positions)[::-1])[::-1]
+    digits = np.flatnonzero(digit)
+    values = (data[digits] - ord('0')) * 10.0 ** (ends[digits] - 1 - digits)
+    numbers = np.bincount(ends[digits], weights=values, minlength=size + 1)
+    numbered = np.zeros(size + 1, dtype=bool)
+    numbered[ends[digits]] = True
+
+    tags = np.flatnonzero(_rle_tags(data))
+    codes = data[tags]
+    before = data[np.maximum(tags - 1, 0)]
+    prefixed = (tags > 0) & (codes >= ord('A')) & (codes <= ord('X')) & (before >= ord('p')) & (before <= ord('y'))
+    first = tags - prefixed
+    counts = np.where(numbered[first], numbers[first], 1).astype(np.int64)
+    states = np.zeros(len(tags), dtype=np.int64)
+    states[codes == ord('o')] = CellStatus.alive.value
+    letters = letter[tags]
+    states[letters] = codes[letters].astype(np.int64) - ord('A') + 1 + 24 * np.where(prefixed, before.astype(np.int64) - ord('p') + 1, 0)[letters]
+
+    newline = codes == ord('$')
+    widths = np.where(newline, 0, counts)
+    ys = y + np.cumsum(np.where(newline, counts, 0))
+    before_width = np.cumsum(widths) - widths
+    last_newline = np.maximum.accumulate(np.where(newline, np.arange(len(tags)), -1))
+    xs = np.where(last_newline >= 0, before_width - before_width[np.maximum(last_newline, 0)], x + before_width)
+    if len(tags):
+        x = int(xs[-1] + widths[-1])
+        y = int(ys[-1])
+    runs = ~newline & (states != CellStatus.dead.value)
+    return xs[runs], ys[runs], counts[runs], states[runs].astype(np.uint8), x, y
+
+# cells of runs, as three arrays
+def run_cells(xs, ys, lengths, states):
+    starts = np.cumsum(lengths) - lengths
+    offsets = np.arange(int(lengths.sum())) - np.repeat(starts, lengths)
+    return np.repeat(xs, lengths) + offsets, np.repeat(ys, lengths), np.repeat(states, lengths)
+
+def _rle_tag(state, states):
+    if states == 2:
+        return 'o' if state else 'b'
+    if state == CellStatus.dead.value:
+        return '.'
+    prefix = '' if state <= 24 else chr(ord('p') + (state - 25) // 24)
+    return prefix + chr(ord('A') + (state - 1) % 24)
+
+# rows are arrays of cells along x, one per y; lines are kept under 70 characters
+def write_rle(path, width, height, rows):
+    states = len(compile_rule(Config.rule))
+    with open(path, 'w') as f:
+        f.write('x = %d, y = %d, rule = %s\n' % (width, height, Config.rule))
+        line = ''
+        skipped = 0
+        for row in rows:
+            live = np.flatnonzero(row)
+            if not len(live):
+                skipped += 1
+                continue
+            tokens = ['%d$' % skipped if skipped > 1 else '$'] if skipped else []
+            row = row[:live[-1] + 1]
+            starts = np.concatenate(([0], np.flatnonzero(row[1:] != row[:-1]) + 1))
+            lengths = np.diff(np.append(starts, len(row)))
+            for n in range(len(starts)):
+                tag = _rle_tag(int(row[starts[n]]), states)
+                tokens.append('%d%s' % (lengths[n], tag) if lengths[n] > 1 else tag)
+            for token in tokens:
+                if len(line) + len(token) > 70:
+                    f.write(line + '\n')
+                    line = ''
+                line += token
+            skipped = 1
+        f.write(line + '!\n')
+
+# Macrocell: a line per quadtree node, children first. '1 2 0 3' style lines are nodes of the
+# given level with the line numbers of their nw, ne, sw, se children, 0 for empty ones;
+# 8x8 leaves are rows of . and * ended by $. Two state rules only.
+def read_macrocell(path, life):
+    life.clear()
+    nodes = [None]
+    root = None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for line in iter(data.readline, b''):
+            line = line.strip()
+            if not line or line.startswith(b'['):
+                continue
+            if line.startswith(b'#'):
+                if line.startswith(b'#G'):
+                    life.generation = int(line[2:])
+                continue
+            if line[:1] in b'.*$':
+                cells = np.zeros((8, 8), dtype=np.uint8)
+                x = y = 0
+                for char in line:
+                    if char == ord('$'):
+                        x = 0
+                        y += 1
+                        continue
+                    if char == ord('*'):
+                        cells[x][y] = CellStatus.alive.value
+                    x += 1
+                root = life._build(cells, 3)
+            else:
+                k, nw, ne, sw, se = [int(value) for value in line.split()]
+                e = life.empty(k - 1)
+                root = life.join(*[nodes[n] if n else e for n in (nw, ne, sw, se)])
+            nodes.append(root)
+    if root is not None:
+        # centred on (0, 0) like Golly
+        life.root = root
+        life.origin = [-(1 << (root.k - 1)), -(1 << (root.k - 1))]
+
+def write_macrocell(path, life):
+    numbers = {None: 0}
+    with open(path, 'w') as f:
+        f.write('[M2] (cellular_automata_2d)\n#R %s\n' % Config.rule)
+        if life.generation:
+            f.write('#G %d\n' % life.generation)
+        if life.root.population == 0:
+            f.write('$\n')
+            return
+        while life.root.k < 3:
+            life._expand()
+        _write_macrocell_node(f, life, life.root, numbers)
+
+def _write_macrocell_node(f, life, node, numbers):
+    if node.population == 0:
+        return 0
+    number = numbers.get(node)
+    if number:
+        return number
+    if node.k == 3:
+        cells = np.zeros((8, 8), dtype=np.uint8)
+        life._paint(cells, node, 0, 0)
+        line = ''.join(''.join('*' if cells[x][y] else '.' for x in range(8)).rstrip('.') + '$' for y in range(8))
+    else:
+        children = [_write_macrocell_node(f, life, child, numbers) for child in (node.nw, node.ne, node.sw, node.se)]
+        line = '%d %d %d %d %d' % (node.k, children[0], children[1], children[2], children[3])
+    f.write(line + '\n')
+    numbers[node] = len(numbers)
+    return numbers[node]
+
+# (x0, y0, band) of bands of height rows covering the bounds of a HashLife or SparsePlane
+def pattern_bands(pattern, height):
+    bounds = pattern.bounds()
+    if bounds is None:
+        return
+    x0 = bounds[0] - bounds[0] % height
+    width = bounds[2] + 1 - x0
+    for y0 in range(bounds[1] - bounds[1] % height, bounds[3] + 1, height):
+        yield x0, y0, pattern.get_grid(x0, y0, width, height)
+
+# pattern is a grid indexed [x][y], a SparsePlane or a HashLife
+def write_pattern(path, pattern):
+    if path.endswith('.mc'):
+        if not isinstance(pattern, HashLife):
+            life = HashLife()
+            if isinstance(pattern, SparsePlane):
+                life.set_plane(pattern)
+            else:
+                life.set_grid(pattern)
+            pattern = life
+        write_macrocell(path, pattern)
+    elif isinstance(pattern, (HashLife, SparsePlane)):
+        bounds = pattern.bounds() or (0, 0, -1, -1)
+        rows = (band[bounds[0] - x0:, j] for x0, y0, band in pattern_bands(pattern, Config.chunk_size)
+                for j in range(max(bounds[1] - y0, 0), min(bounds[3] + 1 - y0, Config.chunk_size)))
+        write_rle(path, bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1, rows)
+    else:
+        cells = np.asarray(pattern, dtype=np.uint8)
+        write_rle(path, cells.shape[0], cells.shape[1], (cells[:, j] for j in range(cells.shape[1])))
+
+# Config.scale_x x Config.scale_y grid with the pattern in the centre
+def read_pattern_grid(path):
+    grid = np.zeros((Config.scale_x, Config.scale_y), dtype=np.uint8)
+    if path.endswith('.mc'):
+        life = HashLife()
+        read_macrocell(path, life)
+        bounds = life.bounds() or (0, 0, 0, 0)
+        x0 = bounds[0] - (Config.scale_x - (bounds[2] - bounds[0] + 1)) // 2
+        y0 = bounds[1] - (Config.scale_y - (bounds[3] - bounds[1] + 1)) // 2
+        return life.get_grid(x0, y0, Config.scale_x, Config.scale_y)
+    width, height, rule, offset = read_rle_header(path)
+    for xs, ys, lengths, states in read_rle(path):
+        xs, ys, states = run_cells(xs, ys, lengths, states)
+        xs += (Config.scale_x - width) // 2
+        ys += (Config.scale_y - height) // 2
+        inside = (xs >= 0) & (xs < Config.scale_x) & (ys >= 0) & (ys < Config.scale_y)
+        grid[xs[inside], ys[inside]] = states[inside]
+    return grid
+
+# rule given in a pattern file, None if there is none
+def read_pattern_rule(path):
+    if path.endswith('.mc'):
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.startswith(b'#R'):
+                    return line[2:].strip().decode()
+                if line[:1] not in b'#[':
+                    return None
+        return None
+    return read_rle_header(path)[2]
+
+# index just after the widest run of False in a circular mask that has a True
+def gap_end(mask):
+    occupied = np.flatnonzero(mask)
+    gaps = np.diff(np.append(occupied, occupied[0] + len(mask)))
+    return int(occupied[(int(np.argmax(gaps)) + 1) % len(occupied)])
+
+# Digest of the board that does not change when it is shifted, the position of the board it
+# was taken at, and the population. Grids are tori: they are rolled so the widest runs of
+# empty rows and columns wrap around the edges, then cropped to what is left. Unbounded
+# planes (SparsePlane, HashLife) are cropped to their bounds.
+def canonical_form(cells):
+    if isinstance(cells, (SparsePlane, HashLife)):
+        bounds = cells.bounds()
+        if bounds is None:
+            return None, (0, 0), 0
+        offset = (bounds[0], bounds[1])
+        crop = cells.get_grid(bounds[0], bounds[1], bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1)
+    else:
+        grid = np.asarray(cells, dtype=np.uint8)
+        rows = grid.any(axis=1)
+        if not rows.any():
+            return None, (0, 0), 0
+        offset = (gap_end(rows), gap_end(grid.any(axis=0)))
+        rolled = np.roll(grid, (-offset[0], -offset[1]), axis=(0, 1))
+        crop = rolled[:np.flatnonzero(rolled.any(axis=1))[-1] + 1, :np.flatnonzero(rolled.any(axis=0))[-1] + 1]
+    digest = hashlib.blake2b(b'%d %d ' % crop.shape + np.ascontiguousarray(crop).tobytes(), digest_size=16).digest()
+    return digest, offset, int(np.count_nonzero(crop == CellStatus.alive.value))
+
+# kind is 'empty', 'still life', 'oscillator' or 'spaceship'; generation is the first of the
+# cycle and displacement the shift (x, y) per period. Periods are counted in generations
+# between observed frames, so with step_generations > 1 they are multiples of it. Large boards
+# (Config.frame_check_cells) are observed every frame only once they repeated, so there
+# generation can be later than the first of the cycle.
+StableResult = collections.namedtuple('StableResult', 'kind generation period displacement')
+
+class StabilityDetector():
+    def __init__(self):
+        self.seen = collections.OrderedDict()   # digest -> (generation, offset)
+
+    # StableResult once the board repeats, otherwise None
+    def observe(self, generation, cells):
+        digest, offset, population = canonical_form(cells)
+        if digest is None:
+            return StableResult('empty', generation, 1, (0, 0))
+        previous = self.seen.get(digest)
+        if previous is None:
+            self.seen[digest] = (generation, offset)
+            if len(self.seen) > Config.stable_window:
+                self.seen.popitem(last=False)
+            return None
+        first, first_offset = previous
+        displacement = [offset[0] - first_offset[0], offset[1] - first_offset[1]]
+        if not isinstance(cells, (SparsePlane, HashLife)):
+            # shortest way round the torus
+            for axis in range(2):
+                size = np.shape(cells)[axis]
+                displacement[axis] = (displacement[axis] + size // 2) % size - size // 2
+        period = generation - first
+        if displacement != [0, 0]:
+            kind = 'spaceship'
+        elif period == 1:
+            kind = 'still life'
+        else:
+            kind = 'oscillator'
+        return StableResult(kind, first, period, tuple(displacement))
+
+def describe_stable(result):
+    if result.kind == 'empty':
+        return 'empty from generation %d' % result.generation
+    text = '%s, period %d from generation %d' % (result.kind, result.period, result.generation)
+    if result.kind == 'spaceship':
+        text += ', moving (%d, %d)' % result.displacement
+    return text
+
+# soup is the index of the board, settle the first generation of its cycle and period the
+# cycle length; boards given up after soup_generations_max have settle -1 and period 0
+SoupRecord = collections.namedtuple('SoupRecord', 'soup population settle period')
+
+def random_soups(rng, count):
+    boards = np.zeros((count,) + tuple(Config.soup_scale), dtype=np.uint8)
+    x0 = (Config.soup_scale[0] - Config.soup_size) // 2
+    y0 = (Config.soup_scale[1] - Config.soup_size) // 2
+    boards[:, x0 : x0 + Config.soup_size, y0 : y0 + Config.soup_size] = rng.random((count, Config.soup_size, Config.soup_size)) < Config.soup_density
+    return boards
+
+# next generation of every board of an (N x X x Y) stack, each its own torus
+def step_boards(boards, table):
+    alive = alive_cells(boards, table)
+    column_sum = alive + np.roll(alive, 1, axis=1) + np.roll(alive, -1, axis=1)
+    block_sum = column_sum + np.roll(column_sum, 1, axis=2) + np.roll(column_sum, -1, axis=2)
+    return life_rule(block_sum, boards, table)
+
+# two 64 bit hashes per board: its cells as words, weighted by odd random words and summed
+def board_hashes(boards, weights):
+    flat = boards.reshape(len(boards), -1)
+    words = flat.view(np.uint64) if flat.shape[1] % 8 == 0 else flat.astype(np.uint64)
+    return np.stack([(words * weights[0]).sum(axis=1), (words * weights[1]).sum(axis=1)], axis=1)
+
+# Steps Config.soup_batch boards at a time and yields a SoupRecord as each settles. The hashes
+# of the last soup_period_max generations of every board are kept in a ring; settled boards
+# are dropped and new soups take their places, so the batch stays full.
+def soup_search(count, seed = None):
+    table = compile_rule(Config.rule)
+    rng = np.random.default_rng(seed)
+    period_max = Config.soup_period_max
+    X, Y = Config.soup_scale
+    words = X * Y // 8 if X * Y % 8 == 0 else X * Y
+    weights = rng.integers(0, 1 << 64, size=(2, words), dtype=np.uint64, endpoint=False) | np.uint64(1)
+    boards = np.zeros((0, X, Y), dtype=np.uint8)
+    soups = np.zeros(0, dtype=np.int64)
+    ages = np.zeros(0, dtype=np.int64)
+    ring = np.zeros((0, period_max, 2), dtype=np.uint64)
+    slots = np.arange(period_max)
+    next_soup = 0
+    while next_soup < count or len(boards):
+        new = min(Config.soup_batch - len(boards), count - next_soup)
+        if new > 0:
+            boards = np.concatenate([boards, random_soups(rng, new)])
+            soups = np.concatenate([soups, np.arange(next_soup, next_soup + new)])
+            ages = np.concatenate([ages, np.zeros(new, dtype=np.int64)])
+            ring = np.concatenate([ring, np.zeros((new, period_max, 2), dtype=np.uint64)])
+            next_soup += new
+
+        hashes = board_hashes(boards, weights)
+        # first words against the whole ring, both words and the ages only where they match
+        candidates = np.flatnonzero((ring[:, :, 0] == hashes[:, None, 0]).any(axis=1))
+        periods = np.full(len(boards), period_max + 1)
+        if len(candidates):
+            # slot of generation age - lag is (age - lag) % period_max
+            lags = (ages[candidates, None] - slots - 1) % period_max + 1
+            match = (ring[candidates] == hashes[candidates, None, :]).all(axis=2) & (lags <= ages[candidates, None])
+            periods[candidates] = np.where(match, lags, period_max + 1).min(axis=1)
+        settled = periods <= period_max
+        done = settled | (ages >= Config.soup_generations_max)
+        if done.any():
+            finished = np.flatnonzero(done)
+            populations = np.count_nonzero(boards[finished] == CellStatus.alive.value, axis=(1, 2))
+            for k in range(len(finished)):
+                n = finished[k]
+                if settled[n]:
+                    yield SoupRecord(int(soups[n]), int(populations[k]), int(ages[n] - periods[n]), int(periods[n]))
+                else:
+                    yield SoupRecord(int(soups[n]), int(populations[k]), -1, 0)
+            keep = ~done
+            boards, soups, ages, ring, hashes = boards[keep], soups[keep], ages[keep], ring[keep], hashes[keep]
+            if not len(boards):
+                continue
+
+        ring[np.arange(len(boards)), ages % period_max] = hashes
+        boards = step_boards(boards, table)
+        ages += 1
+
+def run_soups(count, seed = None):
+    periods = collections.Counter()
+    for record in soup_search(count, seed):
+        print("soup = %d, population = %d, settle = %d, period = %d" % record)
+        periods[record.period] += 1
+    print("periods: " + ", ".join("%d: %d" % item for item in sorted(periods.items())))
+
+def create_engine(engine = None):
+    engine = Config.engine if engine is None else engine
+    if engine == Engine.python:
+        return PythonEngine()
+    elif engine == Engine.numpy:
+        return NumpyEngine()
+    elif engine == Engine.bitpacked:
+        return BitPackedEngine()
+    elif engine == Engine.active:
+        return ActiveEngine()
+    elif engine == Engine.parallel:
+        return ParallelEngine()
+    elif engine == Engine.hashlife:
+        return HashLifeEngine()
+    elif engine == Engine.sparse:
+        return SparseEngine()
+    else:
+        raise Exception('Invalid engine: %s' % engine)
 
 # Define notification event for thread completion
 EVT_RESULT_ID = wx.NewIdRef()
@@ -122,22 +1522,60 @@ class WorkerThread(Thread):
 
     def run(self):
         global dataStore
-        for i in range(100):
-            if self._want_abort:
-                wx.PostEvent(self._notify_window, ResultEvent("Aborted"))
-                return
+        engine = create_engine()
+        if dataStore.pattern_file:
+            state = engine.load(dataStore.pattern_file)
+            dataStore.pattern_file = None
+        else:
+            state = engine.pack(dataStore.gridInfos)
+        steps = itertools.count() if Config.evolution_max is None else range(Config.evolution_max)
+        if Config.history_budget:
+            dataStore.history.truncate(dataStore.generation)
+            if dataStore.history.last_generation() != dataStore.generation:
+                dataStore.history.append(dataStore.generation, shown_window(dataStore.gridInfos))
+        dataStore.stable = None
+        detector = StabilityDetector() if Config.detect_stable else None
+        # both cost a pass over the board, on large boards they only see some frames
+        check_every = max(1, Config.scale_x * Config.scale_y // Config.frame_check_cells)
+        stable_every = check_every
+        # skipped frames are stepped again on the torus, unbounded planes keep every frame
+        history_every = 1 if Config.engine in (Engine.hashlife, Engine.sparse) else check_every
+        try:
+            # the window samples dataStore on its own timer, nothing is posted per step
+            for i in steps:
+                if detector and i % stable_every == 0:
+                    # unbounded engines are checked on the whole plane, not the view
+                    stable = detector.observe(dataStore.generation, state if isinstance(state, HashLife) else dataStore.gridInfos)
+                    if stable and stable_every > 1 and stable.kind != 'empty':
+                        # repeated between skipped frames, find the exact period on every frame
+                        stable_every = 1
+                        detector = StabilityDetector()
+                    elif stable:
+                        dataStore.stable = stable
+                        break
 
-            print("step = %d" % i)
-            print(dataStore.gridInfos)
-            new_gridInfos = [[ 0 for col in range(Config.scale_y) ] for row in range(Config.scale_x) ]
-            for x in range(Config.scale_x):
-                for y in range(Config.scale_y):
-                    new_gridInfos[x][y] = get_next_status(x, y, dataStore.gridInfos)
+                if self._want_abort:
+                    wx.PostEvent(self._notify_window, ResultEvent("Aborted"))
+                    return
 
-            dataStore.gridInfos = new_gridInfos
+                state = engine.advance(state, Config.step_generations)
+                generation = dataStore.generation
+                dataStore.gridInfos = engine.unpack(state)
+                dataStore.generation += Config.step_generations
+                if Config.history_budget and (i + 1) % history_every == 0:
+                    dataStore.history.append(dataStore.generation, shown_window(dataStore.gridInfos))
+                for generation in range(generation + 1, generation + Config.step_generations + 1):
+                    if Config.checkpoint_every and generation % Config.checkpoint_every == 0:
+                        engine.save(Config.checkpoint_path % generation, state)
 
-            wx.PostEvent(self._notify_window, ResultEvent(i))
-            time.sleep(Config.interval)
+                if not Config.max_speed:
+                    time.sleep(Config.interval)
+            wx.PostEvent(self._notify_window, ResultEvent("Finished"))
+        finally:
+            # the frame the run stopped at can always be rewound to
+            if Config.history_budget and dataStore.history.last_generation() != dataStore.generation:
+                dataStore.history.append(dataStore.generation, shown_window(dataStore.gridInfos))
+            engine.close(state)
 
     def abort(self):
         self._want_abort = True
@@ -170,10 +1608,31 @@ class MyFrame(wx.Frame):
 
         fileMenu.AppendSeparator()
 
+        self.openMenuItem = fileMenu.Append(wx.NewIdRef(), "Open pattern...", "Start from an RLE or macrocell file")
+        self.Bind(wx.EVT_MENU, self.onOpen, self.openMenuItem)
+
+        self.saveMenuItem = fileMenu.Append(wx.NewIdRef(), "Save pattern...", "Save the board as RLE or macrocell")
+        self.Bind(wx.EVT_MENU, self.onSave, self.saveMenuItem)
+
+        fileMenu.AppendSeparator()
+
         self.exitMenuItem = fileMenu.Append(wx.NewIdRef(), "Exit", "Exit application")
         self.Bind(wx.EVT_MENU, self.onExit, self.exitMenuItem)   
 
         menuBar.Append(fileMenu, "&File")
+
+        historyMenu = wx.Menu()
+
+        self.backMenuItem = historyMenu.Append(wx.NewIdRef(), "Step back\tCtrl+Left", "Show the frame before")
+        self.Bind(wx.EVT_MENU, self.onStepBack, self.backMenuItem)
+
+        self.forwardMenuItem = historyMenu.Append(wx.NewIdRef(), "Step forward\tCtrl+Right", "Show the frame after")
+        self.Bind(wx.EVT_MENU, self.onStepForward, self.forwardMenuItem)
+
+        self.exportMenuItem = historyMenu.Append(wx.NewIdRef(), "Export...", "Save every kept frame as a pattern file")
+        self.Bind(wx.EVT_MENU, self.onExport, self.exportMenuItem)
+
+        menuBar.Append(historyMenu, "&History")
         self.SetMenuBar(menuBar)
 
         # add statusbar
@@ -185,14 +1644,33 @@ class MyFrame(wx.Frame):
         self.SetSize((Config.scale_x + 2) * Config.side_size + 12 , (Config.scale_y + 2) * Config.side_size + 80)
         #self.Centre()
 
-     #----------------------------------------------------------------------       
-    def OnPaint(self, e):
-        dc = wx.PaintDC(self)
+        # offscreen bitmap of the board, the timer redraws the changed cells on it
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.brushes = [wx.Brush(Config.Color_dead, wx.SOLID), wx.Brush(Config.Color_alive, wx.SOLID),
+                        wx.Brush(Config.Color_dying, wx.SOLID)]
+        self.bitmap = None
+        self.shown = None
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnTimer, self.timer)
+        self.timer.Start(1000 // Config.fps)
+
+    #----------------------------------------------------------------------
+    # the shown window of the latest frame, unbounded planes only walk the chunks in it
+    def shownFrame(self):
+        global dataStore
+        return shown_window(dataStore.gridInfos)
 
+    #----------------------------------------------------------------------
+    # background and lines of the board, then every cell of the frame
+    def drawBoard(self, frame):
         offset_x = Config.side_size
         offset_y = Config.side_size
-
-        global dataStore
+        width, height = self.GetClientSize()
+        self.bitmap = wx.Bitmap(max(width, (Config.scale_x + 2) * Config.side_size),
+                                max(height, (Config.scale_y + 2) * Config.side_size))
+        dc = wx.MemoryDC(self.bitmap)
+        dc.SetBackground(wx.Brush(Config.Color_background, wx.SOLID))
+        dc.Clear()
 
         # draw Matrix Background
         dc.SetPen(wx.Pen(Config.Color_border, 1, wx.SOLID))
@@ -209,22 +1687,61 @@ class MyFrame(wx.Frame):
             dc.DrawLine(offset_x, offset_y + i * Config.side_size, 
                         offset_x + Config.scale_x * Config.side_size, offset_y + i * Config.side_size)
 
-        # Pain Grid
+        xs, ys = np.nonzero(np.ones(frame.shape, dtype=bool))
+        self.drawCells(dc, frame, xs, ys)
+        dc.SelectObject(wx.NullBitmap)
+        self.shown = frame
+
+    #----------------------------------------------------------------------
+    # cells [xs[n]][ys[n]] in one call, with the brushes made once in InitUI
+    def drawCells(self, dc, frame, xs, ys):
+        states = np.minimum(frame[xs, ys], len(self.brushes) - 1)
+        left = Config.side_size + xs * Config.side_size + 1
+        top = Config.side_size + ys * Config.side_size + 1
+        rectangles = [(int(left[n]), int(top[n]), Config.side_size - 1, Config.side_size - 1) for n in range(len(xs))]
         dc.SetPen(wx.Pen(Config.Color_border, 1, wx.TRANSPARENT))
-        for i in range(Config.scale_x):
-            for j in range(Config.scale_y):
-                if(dataStore.gridInfos[i][j] == CellStatus.alive.value):
-                    dc.SetBrush(wx.Brush(Config.Color_alive, wx.SOLID))
-                else:
-                    dc.SetBrush(wx.Brush(Config.Color_dead, wx.SOLID))
-               
-                dc.DrawRectangle(offset_x + i * Config.side_size + 1, offset_y + j * Config.side_size + 1, 
-                         Config.side_size - 1, Config.side_size - 1)
-        
+        dc.DrawRectangleList(rectangles, None, [self.brushes[state] for state in states])
+
+    #----------------------------------------------------------------------
+    # redraw the cells that changed since the last call on the bitmap, returns the
+    # rectangle to refresh or None
+    def updateCanvas(self):
+        frame = self.shownFrame()
+        if self.bitmap is None or self.shown is None or self.shown.shape != frame.shape:
+            self.drawBoard(frame)
+            return wx.Rect(0, 0, self.bitmap.GetWidth(), self.bitmap.GetHeight())
+        xs, ys = np.nonzero(frame != self.shown)
+        if not len(xs):
+            return None
+        dc = wx.MemoryDC(self.bitmap)
+        self.drawCells(dc, frame, xs, ys)
+        dc.SelectObject(wx.NullBitmap)
+        self.shown = frame
+        return wx.Rect(Config.side_size + int(xs.min()) * Config.side_size, Config.side_size + int(ys.min()) * Config.side_size,
+                       int(xs.max() - xs.min() + 1) * Config.side_size + 1, int(ys.max() - ys.min() + 1) * Config.side_size + 1)
+
+    #----------------------------------------------------------------------
+    # samples the latest frame the worker finished, whatever its generation
+    def OnTimer(self, event):
+        global dataStore
+        rect = self.updateCanvas()
+        if rect is not None:
+            self.RefreshRect(rect, False)
+        if self.worker:
+            self.statusbar.SetStatusText('Evolution steps: %d' % dataStore.generation)
+
+    #----------------------------------------------------------------------
+    def OnPaint(self, e):
+        dc = wx.BufferedPaintDC(self)
+        if self.bitmap is None:
+            self.updateCanvas()
+        dc.DrawBitmap(self.bitmap, 0, 0)
+
     #----------------------------------------------------------------------   
     def onExit(self, event):
         if self.worker:
             self.worker.abort()
+        self.timer.Stop()
         self.Close()
 
     #----------------------------------------------------------------------
@@ -241,7 +1758,9 @@ class MyFrame(wx.Frame):
     #----------------------------------------------------------------------
     def onStop(self, event):
         if self.worker:
+            # wait for the step in progress, it writes dataStore and the history
             self.worker.abort()
+            self.worker.join()
             self.worker = None
         else:
             raise Exception("worker is not running!")
@@ -253,26 +1772,104 @@ class MyFrame(wx.Frame):
     def onReset(self, event):
         self.reset()
 
+    #----------------------------------------------------------------------
+    def onStepBack(self, event):
+        self.showHistory(-1)
+
+    #----------------------------------------------------------------------
+    def onStepForward(self, event):
+        self.showHistory(1)
+
+    #----------------------------------------------------------------------
+    # stops the run and shows a kept frame, a new start continues from it
+    def showHistory(self, offset):
+        global dataStore
+        if self.worker:
+            self.onStop(None)
+        generation = dataStore.history.step(dataStore.generation, offset)
+        if generation is None:
+            return
+        dataStore.generation, dataStore.gridInfos = generation, dataStore.history.frame_at(generation)
+        dataStore.pattern_file = None
+        self.statusbar.SetStatusText('Evolution steps: %d' % dataStore.generation)
+
+    #----------------------------------------------------------------------
+    def onExport(self, event):
+        global dataStore
+        if dataStore.history.empty():
+            return
+        with wx.FileDialog(self, "Export history", wildcard="RLE (*.rle)|*.rle|Macrocell (*.mc)|*.mc",
+                           style=wx.FD_SAVE) as dialog:
+            if dialog.ShowModal() == wx.ID_CANCEL:
+                return
+            path = dialog.GetPath()
+        base, extension = os.path.splitext(path)
+        first = dataStore.history.segments[0][0][0]
+        count = dataStore.history.export(base.replace('%', '%%') + '_%06d' + (extension or '.rle'), first, dataStore.history.last_generation())
+        self.statusbar.SetStatusText('Exported %d frames' % count)
+
+    #----------------------------------------------------------------------
+    def onOpen(self, event):
+        with wx.FileDialog(self, "Open pattern", wildcard="Patterns (*.rle;*.mc)|*.rle;*.mc",
+                           style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dialog:
+            if dialog.ShowModal() == wx.ID_CANCEL:
+                return
+            Config.pattern_file = dialog.GetPath()
+        Config.rule = read_pattern_rule(Config.pattern_file) or Config.rule
+        self.reset()
+
+    #----------------------------------------------------------------------
+    def onSave(self, event):
+        with wx.FileDialog(self, "Save pattern", wildcard="RLE (*.rle)|*.rle|Macrocell (*.mc)|*.mc",
+                           style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dialog:
+            if dialog.ShowModal() == wx.ID_CANCEL:
+                return
+            path = dialog.GetPath()
+        global dataStore
+        write_pattern(path, dataStore.gridInfos)
+        self.statusbar.SetStatusText('Saved %s' % path)
+
     #----------------------------------------------------------------------
     def reset(self):
         if self.worker:
             self.worker.abort()
+            self.worker.join()
             self.worker = None
             self.startMenuItem.Enable(True)
             self.stopMenuItem.Enable(False)        
         global dataStore
         dataStore.reset()
-        self.Refresh()
+        self.bitmap = None
+        self.Refresh(False)
     #----------------------------------------------------------------------
     def OnResult(self, event):
-        self.Refresh()
-        self.statusbar.SetStatusText('Evolution steps: %s' % event.data)
-        if(event.data == "Stopped"):
+        text = 'Evolution steps: %d, %s' % (dataStore.generation, event.data)
+        if dataStore.stable:
+            text += ': ' + describe_stable(dataStore.stable)
+        self.statusbar.SetStatusText(text)
+        if(event.data == "Finished"):
             self.worker = None
             self.startMenuItem.Enable(True)
             self.stopMenuItem.Enable(False)           
 
 def main():
+    parser = argparse.ArgumentParser(description = 'Life-like cellular automata')
+    parser.add_argument('--rule', default = Config.rule, help = 'rulestring, e.g. B3/S23 or B2/S/C3')
+    parser.add_argument('--engine', choices = [e.name for e in Engine], default = Config.engine.name, help = 'stepping engine')
+    parser.add_argument('--pattern', help = 'RLE or macrocell file to start from')
+    parser.add_argument('--soups', type = int, metavar = 'COUNT', help = 'run a census of COUNT random soups without a window')
+    parser.add_argument('--seed', type = int, help = 'random seed of the soups')
+    args = parser.parse_args()
+    Config.engine = Engine[args.engine]
+    Config.rule = (args.pattern and read_pattern_rule(args.pattern)) or args.rule
+    compile_rule(Config.rule)
+    if args.soups:
+        run_soups(args.soups, args.seed)
+        return
+    if args.pattern:
+        Config.pattern_file = args.pattern
+        dataStore.reset()
+
     app = wx.App()
     mainWnd = MyFrame(None)
     mainWnd.Show()
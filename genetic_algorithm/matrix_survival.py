@@ -42,6 +42,8 @@ class Configuration():
     scale_x = 12
     scale_y = 12
     max_steps = scale_x * scale_y * 2
+    try_times = 3               # episodes per gene in training
+    vectorized = True           # train with PopulationSimulator instead of Robot, one gene at a time
     #genelib_size = 200         # must can be divided by 4
 
     Color_border = wx.Colour(0, 0, 0)
@@ -191,6 +193,76 @@ class StrategyLib():
 
 Robot_A = Robot(RobotName.A)
 Robot_B = Robot(RobotName.B)
+
+# Plays every episode of a generation at once, try_times per gene: grids with a wall border
+# (so walls read as GridStatus.wall like off-grid cells in strategy_gene) and both robots'
+# positions and directions as arrays. The rules are those of Robot.do_action, with
+# strategy_random "forward_first" for A and strategy_gene for B.
+class PopulationSimulator():
+    # moves and turns indexed by direction value: north, south, west, east
+    delta_x = np.array([0, 0, -1, 1])
+    delta_y = np.array([-1, 1, 0, 0])
+    turn_left = np.array([Direction.west.value, Direction.east.value, Direction.south.value, Direction.north.value])
+    turn_right = np.array([Direction.east.value, Direction.west.value, Direction.north.value, Direction.south.value])
+
+    def __init__(self, try_times = None, seed = None):
+        self.try_times = Configuration.try_times if try_times is None else try_times
+        self.rng = np.random.default_rng(seed)
+
+    # int average score of B for every gene, genes is a (population x gene_length) action matrix
+    def evaluate(self, genes):
+        episodes = len(genes) * self.try_times
+        gene_index = np.repeat(np.arange(len(genes)), self.try_times)
+        index = np.arange(episodes)
+        grids = np.full((episodes, Configuration.scale_x + 2, Configuration.scale_y + 2), GridStatus.wall.value, dtype=np.uint8)
+        grids[:, 1:-1, 1:-1] = GridStatus.initial.value
+        a_x = np.full(episodes, 1)
+        a_y = np.full(episodes, 1)
+        a_direction = np.full(episodes, Direction.south.value)
+        grids[index, a_x, a_y] = GridStatus.pained_by_A.value
+        b_x = np.full(episodes, Configuration.scale_x)
+        b_y = np.full(episodes, Configuration.scale_y)
+        b_direction = np.full(episodes, Direction.north.value)
+        grids[index, b_x, b_y] = GridStatus.pained_by_B.value
+
+        for i in range(Configuration.max_steps):
+            # A goes forward onto any cell it has not painted, otherwise does something random
+            ahead = grids[index, a_x + self.delta_x[a_direction], a_y + self.delta_y[a_direction]]
+            forward = (ahead != GridStatus.wall.value) & (ahead != GridStatus.pained_by_A.value)
+            actions = np.where(forward, Action.forward.value, self.rng.integers(0, 3, episodes))
+            a_x, a_y, a_direction = self.act(grids, index, a_x, a_y, a_direction, actions, GridStatus.pained_by_A)
+
+            # B looks its action up in its gene, by north, west, south, east and direction
+            condition = grids[index, b_x, b_y - 1].astype(np.intp)
+            condition = condition * 4 + grids[index, b_x - 1, b_y]
+            condition = condition * 4 + grids[index, b_x, b_y + 1]
+            condition = condition * 4 + grids[index, b_x + 1, b_y]
+            condition = condition * 4 + b_direction
+            actions = genes[gene_index, condition]
+            b_x, b_y, b_direction = self.act(grids, index, b_x, b_y, b_direction, actions, GridStatus.pained_by_B)
+
+        scores = np.count_nonzero(grids == GridStatus.pained_by_B.value, axis=(1, 2))
+        return scores.reshape(len(genes), self.try_times).sum(axis=1) // self.try_times
+
+    # one action of every episode, then the robot paints where it stands
+    def act(self, grids, index, x, y, direction, actions, grid_status):
+        forward = actions == Action.forward.value
+        next_x = x + self.delta_x[direction]
+        next_y = y + self.delta_y[direction]
+        blocked = grids[index, next_x, next_y] == GridStatus.wall.value
+        move = forward & ~blocked
+        x = np.where(move, next_x, x)
+        y = np.where(move, next_y, y)
+        # 如果撞墙，随机调整一下方向
+        direction = np.where(forward & blocked, self.rng.integers(0, 4, len(index)), direction)
+        direction = np.where(actions == Action.turn_left.value, self.turn_left[direction], direction)
+        direction = np.where(actions == Action.turn_right.value, self.turn_right[direction], direction)
+        grids[index, x, y] = grid_status.value
+        return x, y, direction
+
+# gene strings as a (genes x gene_length) matrix of action values
+def gene_matrix(gene_libs):
+    return np.array([np.frombuffer(gene_info[0].encode(), dtype=np.uint8) - ord('0') for gene_info in gene_libs])
         
 # create gene libs
 def init_gene_libs():
@@ -259,33 +331,41 @@ class WorkerThread(Thread):
             gene_libs = init_gene_libs()
             variability_count = int(Configuration.gene_length * Configuration.variability_ratio)
 
+            simulator = PopulationSimulator()
             evolution_count = 0
             while evolution_count < Configuration.evolution_limit:
                 
                 score_B_best = 0
-                for gene_info in gene_libs:
-                    try_times = 3
-                    score_B_sum = 0                  
-                    # 每个策略跑若干次
-                    for try_time in range(try_times):
-                        dataStore.reset()
-                        for i in range(Configuration.max_steps):
-                            #Robot_A.do_action(StrategyLib.strategy_random)
-                            Robot_A.do_action(StrategyLib.strategy_random, "forward_first")
-                            Robot_B.do_action(StrategyLib.strategy_gene, gene_info[0])
-                        score_A, score_B = dataStore.get_result()
-                        score_B_sum += score_B
-                        
-                    score_B_avarage = int(score_B_sum / try_times)
-                    if(score_B_avarage > score_B_best):
-                        score_B_best = score_B_avarage
-
-                    data = 'evolution_count = %d, score_B_avarage = %d, score_B_best = %d' % (evolution_count, score_B_avarage, score_B_best)
+                if Configuration.vectorized:
+                    scores = simulator.evaluate(gene_matrix(gene_libs))
+                    for i in range(len(gene_libs)):
+                        gene_libs[i][1] = int(scores[i])
+                    data = 'evolution_count = %d, score_B_avarage = %d, score_B_best = %d' % (evolution_count, int(scores.mean()), scores.max())
                     print(data)
-                    #score_A, score_B = dataStore.get_result()
-                    #data = 'evolution_count = %d, score_A = %d, score_B = %d' % (evolution_count, score_A, score_B)
+                else:
+                    for gene_info in gene_libs:
+                        try_times = Configuration.try_times
+                        score_B_sum = 0                  
+                        # 每个策略跑若干次
+                        for try_time in range(try_times):
+                            dataStore.reset()
+                            for i in range(Configuration.max_steps):
+                                #Robot_A.do_action(StrategyLib.strategy_random)
+                                Robot_A.do_action(StrategyLib.strategy_random, "forward_first")
+                                Robot_B.do_action(StrategyLib.strategy_gene, gene_info[0])
+                            score_A, score_B = dataStore.get_result()
+                            score_B_sum += score_B
+                        
+                        score_B_avarage = int(score_B_sum / try_times)
+                        if(score_B_avarage > score_B_best):
+                            score_B_best = score_B_avarage
+
+                        data = 'evolution_count = %d, score_B_avarage = %d, score_B_best = %d' % (evolution_count, score_B_avarage, score_B_best)
+                        print(data)
+                        #score_A, score_B = dataStore.get_result()
+                        #data = 'evolution_count = %d, score_A = %d, score_B = %d' % (evolution_count, score_A, score_B)
                     
-                    gene_info[1] = score_B_avarage
+                        gene_info[1] = score_B_avarage
                     
 
                 # sort gene libs